@@ -0,0 +1,29 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'sql', 'view', 'calls', 'total_time', 'average_time', 'max_time',
+        'last_seen'
+    )
+    list_filter = ('view',)
+    search_fields = ('sql', 'view', 'frame')
+    # Строки пишет только core.slow_queries; удалить — значит начать
+    # счёт заново
+    readonly_fields = (
+        'fingerprint', 'sql', 'view', 'frame', 'plan', 'calls',
+        'total_time', 'average_time', 'max_time', 'first_seen', 'last_seen'
+    )
+    fields = readonly_fields
+
+    def average_time(self, obj):
+        return round(obj.average_time, 4)
+    average_time.short_description = 'В среднем, с'
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db_routing, versions
+        from .sqlite import apply_pragmas
+
+        connection_created.connect(apply_pragmas)
+        # Свежие данные реплика могла ещё не получить
+        versions.versions_read.connect(db_routing.versions_read)
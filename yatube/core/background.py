@@ -0,0 +1,47 @@
+"""Фоновые задачи в пулах потоков.
+
+Задача в потоке пула открывает свои соединения с базой; `close_connections`
+закрывает их после каждой задачи, чтобы соединения не копились.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+
+def close_connections(func):
+    """Обёртка задачи для потока пула: после неё закрывает соединения
+    потока с базой."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+class BackgroundPool:
+    """Пул из `settings.<setting>` потоков, создаваемый при первой задаче.
+
+    При нуле потоков задача выполняется сразу в текущем потоке.
+    """
+
+    def __init__(self, setting, name):
+        self.setting = setting
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        workers = getattr(settings, self.setting)
+        if not workers:
+            return func(*args)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix=self.name
+                )
+        return self._executor.submit(close_connections(func), *args)
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database(verbosity=0, name=None):
+    """Одноразовая база со всеми миграциями для бенчмарков.
+
+    Создаётся так же, как тестовая, поэтому рабочая база не трогается.
+    `name` задаёт файл базы вместо базы в памяти для SQLite: большой
+    набор данных может не поместиться в память.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу; `values` должны быть отсортированы."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[rank]
+
+
+@contextmanager
+def stopwatch():
+    """Засекает время блока: `with stopwatch() as elapsed: ...; elapsed()`."""
+    start = perf_counter()
+    finish = None
+
+    def elapsed():
+        return (finish or perf_counter()) - start
+
+    try:
+        yield elapsed
+    finally:
+        finish = perf_counter()
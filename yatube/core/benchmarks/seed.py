@@ -0,0 +1,196 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.utils import timezone
+
+WORDS = (
+    'пост', 'лента', 'автор', 'группа', 'подписка', 'комментарий', 'дата',
+    'текст', 'новость', 'фото', 'заметка', 'день', 'город', 'книга', 'кофе',
+    'код', 'релиз', 'погода', 'встреча', 'идея', 'проект', 'вечер', 'утро',
+)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает `auto_now_add`, чтобы `bulk_create` сохранил
+    заданные даты, а не текущее время."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
+
+
+class Seeder:
+    """Быстро наполняет пустую базу правдоподобными данными через
+    `bulk_create`.
+
+    Модели берутся из реестра `apps`, поэтому подходит и исторический
+    реестр миграций. Популярность авторов распределена по закону Ципфа:
+    немногие авторы пишут большую часть постов и собирают большую часть
+    подписчиков. Рассчитан на свежую базу, где id идут подряд.
+    """
+
+    def __init__(self, apps, batch_size=5000, seed=0, log=None,
+                 span_days=365):
+        self.apps = apps
+        self.User = apps.get_model('auth', 'User')
+        self.Group = apps.get_model('posts', 'Group')
+        self.Post = apps.get_model('posts', 'Post')
+        self.Comment = apps.get_model('posts', 'Comment')
+        self.Follow = apps.get_model('posts', 'Follow')
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.span = timedelta(days=span_days).total_seconds()
+        self.user_ids = []
+        self.group_ids = []
+        self.post_ids = range(0)
+        self.author_weights = []
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    def _next_id(self, model):
+        last_id = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first()
+        return (last_id or 0) + 1
+
+    def _ids(self, model, first_id):
+        return range(first_id, self._next_id(model))
+
+    def _text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize()
+
+    def _date(self):
+        return self.now - timedelta(seconds=self.random.random() * self.span)
+
+    def _authors(self, count):
+        return self.random.choices(
+            self.user_ids, cum_weights=self.author_weights, k=count
+        )
+
+    def users(self, total, prefix='bench'):
+        first_id = self._next_id(self.User)
+        numbers = iter(range(first_id, first_id + total))
+        for size in self._batches(total):
+            self.User.objects.bulk_create(
+                self.User(
+                    username=f'{prefix}{next(numbers)}',
+                    # Пароль без входа: хеширование сильно замедлило бы сид
+                    password='!',
+                )
+                for _ in range(size)
+            )
+        self.user_ids = list(self._ids(self.User, first_id))
+        self.random.shuffle(self.user_ids)
+        self.author_weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(self.user_ids))
+        ))
+        self.log(f'Пользователей: {len(self.user_ids)}')
+
+    def groups(self, total):
+        first_id = self._next_id(self.Group)
+        self.Group.objects.bulk_create(
+            self.Group(
+                title=f'Группа {number}',
+                slug=f'bench-group-{first_id + number}',
+                description=self._text(12),
+            )
+            for number in range(total)
+        )
+        self.group_ids = list(self._ids(self.Group, first_id))
+        self.log(f'Групп: {len(self.group_ids)}')
+
+    def posts(self, total, group_share=0.7, images=()):
+        first_id = self._next_id(self.Post)
+        pub_date = self.Post._meta.get_field('pub_date')
+        with explicit_dates(pub_date):
+            for size in self._batches(total):
+                self.Post.objects.bulk_create(
+                    self.Post(
+                        text=self._text(self.random.randint(5, 60)),
+                        author_id=author_id,
+                        group_id=(
+                            self.random.choice(self.group_ids)
+                            if self.group_ids
+                            and self.random.random() < group_share
+                            else None
+                        ),
+                        image=(
+                            self.random.choice(images)
+                            if images and self.random.random() < 0.3
+                            else ''
+                        ),
+                        pub_date=self._date(),
+                    )
+                    for author_id in self._authors(size)
+                )
+        self.post_ids = self._ids(self.Post, first_id)
+        self.log(f'Постов: {len(self.post_ids)}')
+
+    def comments(self, total):
+        created = self.Comment._meta.get_field('created')
+        with explicit_dates(created):
+            for size in self._batches(total):
+                self.Comment.objects.bulk_create(
+                    self.Comment(
+                        post_id=self.random.choice(self.post_ids),
+                        author_id=self.random.choice(self.user_ids),
+                        text=self._text(self.random.randint(3, 20)),
+                        created=self._date(),
+                    )
+                    for _ in range(size)
+                )
+        self.log(f'Комментариев: {total}')
+
+    def follows(self, per_user):
+        """Каждый пользователь подписывается в среднем на `per_user`
+        авторов; популярные авторы собирают больше подписчиков."""
+        pending = []
+        total = 0
+        for user_id in self.user_ids:
+            count = min(
+                len(self.user_ids) - 1,
+                int(self.random.expovariate(1 / per_user)) if per_user else 0
+            )
+            authors = set(self._authors(count)) - {user_id}
+            pending.extend(
+                self.Follow(user_id=user_id, author_id=author_id)
+                for author_id in authors
+            )
+            if len(pending) >= self.batch_size:
+                self.Follow.objects.bulk_create(pending)
+                total += len(pending)
+                pending = []
+        self.Follow.objects.bulk_create(pending)
+        total += len(pending)
+        self.log(f'Подписок: {total}')
+
+    def timelines(self, user_ids, depth=200):
+        """Заполняет ленты подписок только для `user_ids`: при степенном
+        графе подписок полная раскладка постов популярных авторов по всем
+        подписчикам заняла бы миллиарды строк."""
+        Timeline = self.apps.get_model('posts', 'Timeline')
+        total = 0
+        for user_id in user_ids:
+            authors = self.Follow.objects.filter(
+                user_id=user_id
+            ).values('author_id')
+            posts = self.Post.objects.filter(
+                author_id__in=authors
+            ).order_by('-pub_date', '-id').values_list('pk', 'pub_date')
+            entries = Timeline.objects.bulk_create(
+                Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for pk, pub_date in posts[:depth]
+            )
+            total += len(entries)
+        self.log(f'Записей в лентах подписок: {total}')
@@ -0,0 +1,131 @@
+"""Чтение с реплик базы с гарантией «читаю свои записи».
+
+Запрос на чтение к одному из представлений `REPLICA_VIEWS` читает
+с реплики из `DATABASE_REPLICAS`; всё остальное, а также любые записи,
+идёт в основную базу. После изменений по просьбе пользователя — запроса
+небезопасным методом или вызова `note_write()` в представлении — клиент
+получает cookie и ещё `REPLICA_LAG` секунд читает только с основной
+базы: реплика может не успеть получить его изменения. Служебные записи
+(сессия, кеш миниатюр) клиента не закрепляют, иначе cookie получал бы
+почти каждый ответ и страницы не брались бы из кеша.
+
+Кешированные фрагменты и страницы хранятся под версиями данных
+(`core.versions`); если версия моложе `REPLICA_LAG`, запрос тоже
+переключается на основную базу, чтобы в кеш под новой версией не попали
+устаревшие данные с реплики. Версии сообщают о себе сигналом
+`versions_read`, на который `CoreConfig` подписывает `versions_read()`.
+"""
+import random
+import threading
+from time import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+
+
+def read_alias():
+    """База для чтения в текущем потоке."""
+    if getattr(_state, 'primary', True):
+        return DEFAULT_DB_ALIAS
+    return _state.replica
+
+
+def use_primary():
+    """До конца запроса читать с основной базы."""
+    _state.primary = True
+
+
+def use_replica():
+    replicas = settings.DATABASE_REPLICAS
+    if replicas:
+        _state.replica = random.choice(replicas)
+        _state.primary = False
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+def note_write():
+    """Представление изменило данные по просьбе пользователя, даже если
+    запрос пришёл методом GET: клиент закрепляется за основной базой."""
+    _state.wrote = True
+    use_primary()
+
+
+def note_modified(timestamp):
+    """Данные менялись в `timestamp`: если реплика могла ещё не получить
+    изменение, запрос читает с основной базы."""
+    if time() - timestamp < settings.REPLICA_LAG:
+        use_primary()
+
+
+def versions_read(sender, modified, **kwargs):
+    note_modified(modified)
+
+
+def _reset():
+    _state.primary = True
+    _state.wrote = False
+
+
+class ReplicaRouter:
+    """Чтение — с базы, выбранной для запроса, запись — в основную."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Следующие чтения в этом запросе должны видеть запись; клиента
+        # за основной базой закрепляет только `note_write()`
+        use_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Выбирает базу для чтения по представлению и cookie клиента."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _reset()
+        try:
+            response = self.get_response(request)
+            if wrote() or request.method not in SAFE_METHODS:
+                response.set_cookie(
+                    PIN_COOKIE,
+                    str(int(time()) + settings.REPLICA_LAG),
+                    max_age=settings.REPLICA_LAG,
+                    httponly=True,
+                )
+            return response
+        finally:
+            _reset()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and not self.pinned(request)
+        ):
+            use_replica()
+
+    @staticmethod
+    def pinned(request):
+        try:
+            return int(request.COOKIES.get(PIN_COOKIE, 0)) > time()
+        except ValueError:
+            return False
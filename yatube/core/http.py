@@ -0,0 +1,51 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .versions import versions_modified
+
+
+def _timestamp(last_modified):
+    return timegm(last_modified.utctimetuple()) if last_modified else None
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """Ответ 304 (или 412) на условный запрос, если у клиента актуальная
+    версия, иначе `None`. Вызывается до отрисовки страницы — в этом и
+    выигрыш."""
+    etag = quote_etag(etag) if etag else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=_timestamp(last_modified)
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Проставляет ответу `ETag` и `Last-Modified`."""
+    if etag and not response.has_header('ETag'):
+        response['ETag'] = quote_etag(etag)
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
+
+
+def version_validators(request, versions, *parts):
+    """`ETag` и `Last-Modified` страницы, собранной из данных с версиями
+    `versions` (`core.versions`), без обращения к базе.
+
+    В `ETag` входят версии, `parts`, строка запроса и зритель: страница
+    пользователя отличается от анонимной, а CSRF-токен в формах — от
+    сессии к сессии.
+    """
+    if request.user.is_authenticated:
+        viewer = f'{request.user.pk}:{request.META.get("CSRF_COOKIE", "")}'
+    else:
+        viewer = 'anonymous'
+    etag = hashlib.md5(repr((
+        sorted(versions.items()), parts, request.GET.urlencode(), viewer
+    )).encode()).hexdigest()
+    return etag, versions_modified(versions)
@@ -0,0 +1,123 @@
+import multiprocessing
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import percentile
+from core.sqlite.cache import SQLiteCache
+
+COUNTER = 'counter'
+
+
+def backends(workdir, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return {
+        'locmem': LocMemCache('bench', params),
+        'file': FileBasedCache(os.path.join(workdir, 'file'), params),
+        'sqlite': SQLiteCache(os.path.join(workdir, 'cache.sqlite3'), params),
+    }
+
+
+def worker(cache, options, number, results):
+    """Смесь чтений, записей и `incr` по общему набору ключей."""
+    rnd = random.Random(options['seed'] + number)
+    value = 'x' * options['value_size']
+    timings = {'get': [], 'set': [], 'incr': []}
+    deadline = perf_counter() + options['duration']
+    while perf_counter() < deadline:
+        key = f'key:{rnd.randrange(options["keys"])}'
+        draw = rnd.random()
+        start = perf_counter()
+        if draw < options['incr']:
+            operation = 'incr'
+            cache.incr(COUNTER)
+        elif draw < options['incr'] + options['writes']:
+            operation = 'set'
+            cache.set(key, value)
+        else:
+            operation = 'get'
+            cache.get(key)
+        timings[operation].append(perf_counter() - start)
+    results.put(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает LocMemCache, FileBasedCache и SQLiteCache '
+        '(core.sqlite.cache) под нагрузкой из нескольких процессов: '
+        'пропускная способность, задержки и видят ли процессы записи '
+        'друг друга.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Секунд нагрузки на каждый бэкенд.')
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--writes', type=float, default=0.15,
+                            help='Доля записей.')
+        parser.add_argument('--incr', type=float, default=0.05,
+                            help='Доля incr общего счётчика.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        rows = []
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, cache in backends(workdir, options['keys'] * 2).items():
+                cache.clear()
+                cache.set_many({
+                    f'key:{number}': 'x' * options['value_size']
+                    for number in range(options['keys'])
+                })
+                cache.set(COUNTER, 0)
+                results = context.Queue()
+                processes = [
+                    context.Process(
+                        target=worker, args=(cache, options, number, results)
+                    )
+                    for number in range(options['processes'])
+                ]
+                for process in processes:
+                    process.start()
+                timings = {'get': [], 'set': [], 'incr': []}
+                for _ in processes:
+                    for operation, values in results.get().items():
+                        timings[operation].extend(values)
+                for process in processes:
+                    process.join()
+                rows.append((name, timings, cache.get(COUNTER)))
+        self.report(rows, options)
+
+    def report(self, rows, options):
+        self.log(self.style.MIGRATE_HEADING(
+            f'{"кеш":<8} {"оп/с":>9} {"get p50/p99, мкс":>18} '
+            f'{"set p50/p99, мкс":>18} {"incr общий":>14}'
+        ))
+        for name, timings, counter in rows:
+            total = sum(len(values) for values in timings.values())
+            gets = sorted(timings['get'])
+            sets = sorted(timings['set'])
+            incrs = len(timings['incr'])
+            self.log(
+                f'{name:<8} {total / options["duration"]:9.0f} '
+                f'{percentile(gets, 50) * 1e6:8.1f}/'
+                f'{percentile(gets, 99) * 1e6:<9.1f} '
+                f'{percentile(sets, 50) * 1e6:8.1f}/'
+                f'{percentile(sets, 99) * 1e6:<9.1f} '
+                f'{counter:>6}/{incrs:<7}'
+            )
+        self.log(
+            'incr общий — значение счётчика в родительском процессе и '
+            'число incr во всех процессах: у общего атомарного кеша они '
+            'совпадают.'
+        )
@@ -0,0 +1,168 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Q
+
+from core.benchmarks import scratch_database, stopwatch
+from core.benchmarks.seed import Seeder
+
+BEFORE = ('posts', '0012_userstats')
+AFTER = ('posts', '0013_feed_indexes')
+FEED = ('-pub_date', '-id')
+
+
+def global_feed(models, sample):
+    return models.Post.objects.order_by(*FEED)[:11]
+
+
+def deep_global_feed(models, sample):
+    date, pk = sample['cursor']
+    return models.Post.objects.filter(
+        Q(pub_date__lte=date),
+        Q(pub_date__lt=date) | Q(id__lt=pk)
+    ).order_by(*FEED)[:11]
+
+
+def author_feed(models, sample):
+    return models.Post.objects.filter(
+        author_id=sample['author']
+    ).order_by(*FEED)[:11]
+
+
+def group_feed(models, sample):
+    return models.Post.objects.filter(
+        group_id=sample['group']
+    ).order_by(*FEED)[:11]
+
+
+def follow_exists(models, sample):
+    user, author = sample['follow']
+    return models.Follow.objects.filter(
+        user_id=user, author_id=author
+    ).values('id')[:1]
+
+
+def post_comments(models, sample):
+    return models.Comment.objects.filter(
+        post_id=sample['post']
+    ).order_by('created', 'id')[:21]
+
+
+QUERIES = (
+    ('Главная, первая страница', global_feed),
+    ('Главная, глубокая страница', deep_global_feed),
+    ('Посты автора', author_feed),
+    ('Посты группы', group_feed),
+    ('Проверка подписки', follow_exists),
+    ('Комментарии поста', post_comments),
+)
+
+
+class Models:
+    """Модели на заданной миграции: запросы строятся по историческому
+    состоянию, поэтому бенчмарк не зависит от более поздних полей."""
+
+    def __init__(self, apps):
+        self.Post = apps.get_model('posts', 'Post')
+        self.Comment = apps.get_model('posts', 'Comment')
+        self.Follow = apps.get_model('posts', 'Follow')
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет одноразовую базу и сравнивает планы и время горячих '
+        'запросов лент до и после миграции с индексами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=300000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--samples', type=int, default=200,
+                            help='Сколько раз выполнить каждый запрос.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            call_command('migrate', *BEFORE, verbosity=0)
+            loader = MigrationLoader(connection)
+            before = loader.project_state(BEFORE).apps
+            after = loader.project_state(AFTER).apps
+
+            with stopwatch() as elapsed:
+                seeder = Seeder(before, seed=options['seed'], log=self.log)
+                seeder.users(options['users'])
+                seeder.groups(options['groups'])
+                seeder.posts(options['posts'])
+                seeder.comments(options['comments'])
+                seeder.follows(options['follows'])
+            self.log(f'Данные созданы за {elapsed():.1f} с\n')
+            samples = self.samples(Models(before), options)
+
+            self.analyze()
+            results_before = self.measure(Models(before), samples)
+            with stopwatch() as elapsed:
+                call_command('migrate', *AFTER, verbosity=0)
+            self.log(f'Миграция {AFTER[1]} заняла {elapsed():.1f} с\n')
+            self.analyze()
+            results_after = self.measure(Models(after), samples)
+
+        for title, _ in QUERIES:
+            plan_before, time_before = results_before[title]
+            plan_after, time_after = results_after[title]
+            self.log(self.style.MIGRATE_HEADING(title))
+            self.log(f'  до:    {time_before * 1000:8.3f} мс  {plan_before}')
+            self.log(f'  после: {time_after * 1000:8.3f} мс  {plan_after}')
+
+    def analyze(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def samples(self, models, options):
+        rng = random.Random(options['seed'])
+        posts = models.Post.objects.values_list(
+            'id', 'pub_date', 'author_id', 'group_id'
+        )
+        last_id = posts.order_by('-id').first()[0]
+        follows = list(models.Follow.objects.values_list(
+            'user_id', 'author_id'
+        ).order_by('?')[:options['samples']])
+        samples = []
+        for number in range(options['samples']):
+            pk, date, author, group = posts.get(id=rng.randint(1, last_id))
+            user, followed = follows[number % len(follows)]
+            samples.append({
+                'cursor': (date, pk),
+                'author': author,
+                'group': group or 1,
+                'post': pk,
+                # Через раз проверяем существующую подписку
+                'follow': (user, followed if number % 2 else author),
+            })
+        return samples
+
+    def measure(self, models, samples):
+        results = {}
+        for title, build in QUERIES:
+            plan = build(models, samples[0]).explain()
+            plan = ' | '.join(plan.splitlines())
+            timings = []
+            for sample in samples:
+                queryset = build(models, sample)
+                start = perf_counter()
+                list(queryset)
+                timings.append(perf_counter() - start)
+            results[title] = (plan, median(timings))
+        return results
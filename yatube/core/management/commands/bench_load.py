@@ -0,0 +1,209 @@
+import os
+import random
+import tempfile
+from importlib import import_module
+from time import perf_counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from core.benchmarks import percentile, scratch_database, stopwatch
+from core.benchmarks.seed import Seeder
+from posts.models import Comment, Follow, Post, User, UserStats
+from posts.stats import rebuild_user_stats
+from posts.syndication import GENERATORS
+
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+# Адреса, которые меняют данные или сессию даже GET-запросом: посреди
+# прогона они подменили бы базу и разлогинили бы пользователей
+STATEFUL_URLS = {
+    'posts:profile_follow', 'posts:profile_unfollow', 'users:logout'
+}
+IMAGE_SIZES = ((1920, 1080), (960, 540), (640, 640), (480, 800))
+
+
+def url_names():
+    """Имена адресов приложений, кроме `STATEFUL_URLS`, и аргументы,
+    которые они ждут."""
+    for module in URLCONFS:
+        urlconf = import_module(module)
+        for pattern in urlconf.urlpatterns:
+            name = f'{urlconf.app_name}:{pattern.name}'
+            if name not in STATEFUL_URLS:
+                yield name, list(pattern.pattern.converters)
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет одноразовую базу большим набором данных, прогоняет '
+        'адреса posts, users и about, не меняющие данных, анонимом и '
+        'пользователем и печатает перцентили задержки, число запросов '
+        'к базе и пропускную способность.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=5000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--images', type=int, default=8,
+                            help='Сколько разных картинок раздать постам.')
+        parser.add_argument('--viewers', type=int, default=20,
+                            help='Сколько пользователей ходят по сайту.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый адрес и роль.')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument('--db-file',
+                            help='Файл одноразовой базы; по умолчанию '
+                                 'во временном каталоге.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with tempfile.TemporaryDirectory() as workdir:
+            db_file = options['db_file'] or os.path.join(workdir, 'bench.db')
+            with override_settings(MEDIA_ROOT=workdir), \
+                    scratch_database(name=db_file):
+                cache.clear()
+                with stopwatch() as elapsed:
+                    seeder = self.seed(options)
+                self.log(f'Данные созданы за {elapsed():.1f} с\n')
+                results, wall = self.drive(seeder, options)
+        self.report(results, wall)
+
+    def images(self, total):
+        """Картинки разных размеров в MEDIA_ROOT для полей постов."""
+        names = []
+        for number in range(total):
+            name = f'posts/bench-{number}.jpg'
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            size = IMAGE_SIZES[number % len(IMAGE_SIZES)]
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            Image.new('RGB', size, color).save(path, quality=85)
+            names.append(name)
+        return names
+
+    def seed(self, options):
+        seeder = Seeder(apps, seed=options['seed'], log=self.log)
+        seeder.users(options['users'])
+        seeder.groups(options['groups'])
+        seeder.posts(options['posts'], images=self.images(options['images']))
+        seeder.comments(options['comments'])
+        seeder.follows(options['follows'])
+        self.viewers = self.random.sample(
+            seeder.user_ids, min(options['viewers'], len(seeder.user_ids))
+        )
+        seeder.timelines(self.viewers)
+        rebuild_user_stats(User, UserStats, Post, Comment, Follow)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return seeder
+
+    def samples(self, seeder):
+        """Случайные значения аргументов адресов; популярные авторы
+        попадаются чаще, как и в реальном трафике."""
+        usernames = dict(User.objects.values_list('pk', 'username'))
+        slugs = list(seeder.Group.objects.values_list('slug', flat=True))
+        return {
+            'post_id': lambda: self.random.choice(seeder.post_ids),
+            'slug': lambda: self.random.choice(slugs),
+            'username': lambda: usernames[seeder._authors(1)[0]],
+            'feed_format': lambda: self.random.choice(list(GENERATORS)),
+        }
+
+    def clients(self):
+        guest = Client()
+        users = []
+        for user in User.objects.filter(pk__in=self.viewers):
+            client = Client()
+            client.force_login(user)
+            users.append(client)
+        return {'аноним': [guest], 'пользователь': users}
+
+    def drive(self, seeder, options):
+        samples = self.samples(seeder)
+        clients = self.clients()
+        results = []
+        with stopwatch() as wall:
+            for name, arguments in url_names():
+                missing = set(arguments) - set(samples)
+                if missing:
+                    raise CommandError(
+                        f'Нет значений для аргументов {missing} адреса {name}'
+                    )
+                for role, pool in clients.items():
+                    results.append(self.measure(
+                        name, role, pool, arguments, samples, options
+                    ))
+        return results, wall()
+
+    def measure(self, name, role, pool, arguments, samples, options):
+        timings = []
+        queries = []
+        errors = 0
+        total = options['warmup'] + options['requests']
+        for number in range(total):
+            client = pool[number % len(pool)]
+            url = reverse(name, kwargs={
+                argument: samples[argument]() for argument in arguments
+            })
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = perf_counter()
+                response = client.get(url)
+                elapsed = perf_counter() - start
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        timings.sort()
+        return {
+            'name': name,
+            'role': role,
+            'p50': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+            'queries': sum(queries) / len(queries),
+            'rps': len(timings) / sum(timings),
+            'errors': errors,
+            'total': len(timings),
+            'busy': sum(timings),
+        }
+
+    def report(self, results, wall):
+        self.log(self.style.MIGRATE_HEADING(
+            f'{"адрес":<28} {"кто":<13} {"p50, мс":>8} {"p95, мс":>8} '
+            f'{"p99, мс":>8} {"запр.":>6} {"rps":>7} {"ошибок":>6}'
+        ))
+        for row in results:
+            self.log(
+                f'{row["name"]:<28} {row["role"]:<13} '
+                f'{row["p50"] * 1000:8.2f} {row["p95"] * 1000:8.2f} '
+                f'{row["p99"] * 1000:8.2f} {row["queries"]:6.1f} '
+                f'{row["rps"]:7.1f} {row["errors"]:6}'
+            )
+        requests = sum(row['total'] for row in results)
+        busy = sum(row['busy'] for row in results)
+        self.log(
+            f'\nВсего запросов: {requests}, из них в обработке {busy:.1f} с '
+            f'({requests / busy:.1f} запросов в секунду в один поток); '
+            f'прогон с разогревом занял {wall:.1f} с'
+        )
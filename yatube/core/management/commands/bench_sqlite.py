@@ -0,0 +1,172 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+from time import perf_counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (OperationalError, close_old_connections, connection,
+                       connections, transaction)
+from django.test import override_settings
+
+from core.benchmarks import percentile, scratch_database
+from core.benchmarks.seed import Seeder
+from posts.models import Comment, Post
+
+PROFILES = {
+    'обычный': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'pragmas': {},
+        'journal_mode': 'DELETE',
+    },
+    'рабочий': {
+        'ENGINE': 'core.sqlite',
+        'CONN_MAX_AGE': 600,
+        'pragmas': settings.SQLITE_PRODUCTION_PRAGMAS,
+        'journal_mode': 'WAL',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает обычный и рабочий профили SQLite (core.sqlite) под '
+        'смешанной нагрузкой: несколько потоков читают ленту и пишут '
+        'комментарии, как параллельные запросы к сайту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Секунд нагрузки на каждый профиль.')
+        parser.add_argument('--writes', type=float, default=0.2,
+                            help='Доля запросов с записью.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на SQLite.')
+        with tempfile.TemporaryDirectory() as workdir:
+            db_file = os.path.join(workdir, 'bench.db')
+            with scratch_database(name=db_file):
+                seeder = Seeder(apps, seed=options['seed'], log=self.log)
+                seeder.users(options['users'])
+                seeder.posts(options['posts'])
+                seeder.comments(options['comments'])
+                self.user_ids = seeder.user_ids
+                self.post_ids = seeder.post_ids
+                results = {
+                    name: self.run(db_file, profile, options)
+                    for name, profile in PROFILES.items()
+                }
+        self.report(results)
+
+    def run(self, db_file, profile, options):
+        """Прогон нагрузки с настройками соединений профиля."""
+        connection.close()
+        # Режим журнала хранится в файле базы, ставим его явно
+        with sqlite3.connect(db_file) as raw:
+            raw.execute(f'PRAGMA journal_mode = {profile["journal_mode"]}')
+        settings_dict = connections.databases[connection.alias]
+        saved = {
+            key: settings_dict[key] for key in ('ENGINE', 'CONN_MAX_AGE')
+        }
+        settings_dict.update(
+            ENGINE=profile['ENGINE'], CONN_MAX_AGE=profile['CONN_MAX_AGE']
+        )
+        deadline = perf_counter() + options['duration']
+        results = []
+        try:
+            with override_settings(SQLITE_PRAGMAS=profile['pragmas']):
+                threads = [
+                    threading.Thread(
+                        target=self.worker,
+                        args=(deadline, options, number, results)
+                    )
+                    for number in range(options['threads'])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            settings_dict.update(saved)
+        reads = sorted(time for kind, time in results if kind == 'read')
+        writes = sorted(time for kind, time in results if kind == 'write')
+        return {
+            'reads': reads,
+            'writes': writes,
+            'errors': sum(kind == 'error' for kind, _ in results),
+            'duration': options['duration'],
+        }
+
+    def worker(self, deadline, options, number, results):
+        rnd = random.Random(options['seed'] + number)
+        local = []
+        try:
+            while perf_counter() < deadline:
+                # Как обработка запроса: соединение закрывается после
+                # него, если CONN_MAX_AGE не разрешает его держать
+                close_old_connections()
+                write = rnd.random() < options['writes']
+                start = perf_counter()
+                try:
+                    if write:
+                        self.write(rnd)
+                    else:
+                        self.read(rnd)
+                except OperationalError:
+                    local.append(('error', perf_counter() - start))
+                else:
+                    local.append((
+                        'write' if write else 'read', perf_counter() - start
+                    ))
+                close_old_connections()
+        finally:
+            connection.close()
+            results.extend(local)
+
+    def read(self, rnd):
+        list(Post.objects.select_related('author', 'group').order_by(
+            '-pub_date', '-pk'
+        )[:10])
+        post = Post.objects.get(pk=rnd.choice(self.post_ids))
+        list(post.comments.select_related('author')[:10])
+
+    def write(self, rnd):
+        # Запрос с записью в транзакции: сначала чтение, затем запись
+        with transaction.atomic():
+            post = Post.objects.get(pk=rnd.choice(self.post_ids))
+            Comment.objects.create(
+                post=post,
+                author_id=rnd.choice(self.user_ids),
+                text='Комментарий под нагрузкой',
+            )
+
+    def report(self, results):
+        self.log(self.style.MIGRATE_HEADING(
+            f'{"профиль":<10} {"чтений/с":>9} {"записей/с":>10} '
+            f'{"чтение p50/p99, мс":>20} {"запись p50/p99, мс":>20} '
+            f'{"ошибок":>7}'
+        ))
+        for name, row in results.items():
+            reads, writes = row['reads'], row['writes']
+            self.log(
+                f'{name:<10} {len(reads) / row["duration"]:9.0f} '
+                f'{len(writes) / row["duration"]:10.0f} '
+                f'{percentile(reads, 50) * 1000:9.2f}/'
+                f'{percentile(reads, 99) * 1000:<10.2f} '
+                f'{percentile(writes, 50) * 1000:9.2f}/'
+                f'{percentile(writes, 99) * 1000:<10.2f} '
+                f'{row["errors"]:7}'
+            )
@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик DATABASE_REPLICAS '
+        '(для проверки чтения с реплик на одной машине).'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать умеем только базы SQLite.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_DB_REPLICAS.'
+            )
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            name = connections[alias].settings_dict['NAME']
+            # Соединение реплики закрываем, чтобы оно увидело новую копию
+            connections[alias].close()
+            target = sqlite3.connect(name)
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: {name}')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
@@ -0,0 +1,247 @@
+"""Метрики запросов по именам маршрутов в формате Prometheus.
+
+`MetricsMiddleware` считает для каждого маршрута (`posts:main`,
+`posts:post_detail`, ...) запросы по методу и коду ответа, гистограмму
+времени ответа, число и время SQL-запросов, попадания и промахи кеша
+(доля попаданий — `hits / (hits + misses)` в запросе к Prometheus).
+Замер тот же, что у заголовка Server-Timing (`core.timing`).
+
+Счётчики копятся в памяти процесса и раз в `METRICS_FLUSH_INTERVAL`
+секунд одной транзакцией прибавляются к таблице в файле SQLite
+`METRICS_FILE`, общем для всех процессов сервера: запрос не ждёт ни
+соседние процессы, ни диск. `/metrics/` отдаёт сумму по всем
+процессам — с задержкой до интервала сброса у чужих процессов. Без
+`METRICS_FILE` метрики отключены.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from time import monotonic
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from .sqlite.connection import LocalConnection
+from .timing import measure
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS metrics ('
+    'family TEXT NOT NULL, suffix TEXT NOT NULL, labels TEXT NOT NULL, '
+    'le TEXT NOT NULL, value REAL NOT NULL, '
+    'PRIMARY KEY (family, suffix, labels, le)) WITHOUT ROWID',
+)
+UPSERT = (
+    'INSERT INTO metrics VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT (family, suffix, labels, le) '
+    'DO UPDATE SET value = value + excluded.value'
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Семейства метрик: тип и описание
+FAMILIES = {
+    'yatube_requests_total': ('counter', 'Запросы по маршруту и коду.'),
+    'yatube_request_duration_seconds': ('histogram', 'Время ответа, с.'),
+    'yatube_db_queries_total': ('counter', 'SQL-запросы.'),
+    'yatube_db_query_seconds_total': ('counter', 'Время SQL-запросов, с.'),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кеш.'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кеша.'),
+}
+# Порядок строк гистограммы внутри набора меток
+SUFFIXES = {'_bucket': 0, '_sum': 1, '_count': 2, '': 0}
+# Остальные методы учитываются как `other`: метод задаёт клиент, и
+# произвольные значения плодили бы ряды
+METHODS = {
+    'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE',
+    'CONNECT',
+}
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _labels(**labels):
+    return ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels.items()
+    )
+
+
+def _number(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _le(bound):
+    return '+Inf' if bound == float('inf') else _number(float(bound))
+
+
+class Metrics:
+    """Счётчики процесса и их общая копия в файле SQLite."""
+
+    BUSY_TIMEOUT = 5.0
+
+    def __init__(self, path, buckets, flush_interval):
+        self.path = path
+        self.buckets = [_le(bound) for bound in buckets] + ['+Inf']
+        self.bounds = [float(bound) for bound in buckets] + [float('inf')]
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._connection = LocalConnection(path, SCHEMA, self.BUSY_TIMEOUT)
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pending = defaultdict(float)
+        self._flushed = monotonic()
+
+    def observe(self, view, method, status, timing):
+        """Учитывает запрос к маршруту `view` с замером `timing`."""
+        duration = timing.total()
+        summary = timing.summary()
+        route = _labels(view=view)
+        method = method if method in METHODS else 'other'
+        samples = [
+            ('yatube_requests_total', '',
+             _labels(view=view, method=method, status=status), '', 1),
+            ('yatube_request_duration_seconds', '_sum', route, '', duration),
+            ('yatube_request_duration_seconds', '_count', route, '', 1),
+            ('yatube_db_queries_total', '', route, '',
+             timing.counts['queries']),
+            ('yatube_db_query_seconds_total', '', route, '', summary['db']),
+            ('yatube_cache_hits_total', '', route, '',
+             timing.counts['cache_hits']),
+            ('yatube_cache_misses_total', '', route, '',
+             timing.counts['cache_misses']),
+        ]
+        # Корзины гистограммы накопительные, как их ждёт Prometheus, и
+        # выводятся все, даже пустые
+        samples.extend(
+            ('yatube_request_duration_seconds', '_bucket', route, le,
+             int(duration <= bound))
+            for le, bound in zip(self.buckets, self.bounds)
+        )
+        with self._lock:
+            if self._pid != os.getpid():
+                # Счётчики, унаследованные при fork, сбросит родитель
+                self._reset()
+            for *key, value in samples:
+                self._pending[tuple(key)] += value
+            due = monotonic() - self._flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Прибавляет накопленное в процессе к общей таблице."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            pending, self._pending = self._pending, defaultdict(float)
+            self._flushed = monotonic()
+        if not pending:
+            return
+        rows = [(*key, value) for key, value in pending.items()]
+        try:
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.executemany(UPSERT, rows)
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        except sqlite3.Error:
+            logger.exception('Не удалось записать метрики в %s', self.path)
+            # Вернём счётчики, чтобы записать их в следующий раз
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        rows = self._connection().execute(
+            'SELECT family, suffix, labels, le, value FROM metrics'
+        ).fetchall()
+        series = defaultdict(list)
+        for family, suffix, labels, le, value in rows:
+            series[family].append((labels, suffix, le, value))
+        lines = []
+        for family, (kind, description) in FAMILIES.items():
+            lines.append(f'# HELP {family} {description}')
+            lines.append(f'# TYPE {family} {kind}')
+            samples = sorted(series[family], key=lambda sample: (
+                sample[0], SUFFIXES[sample[1]],
+                float(sample[2]) if sample[2] else 0.0,
+            ))
+            for labels, suffix, le, value in samples:
+                if le:
+                    labels = f'{labels},le="{le}"'
+                lines.append(f'{family}{suffix}{{{labels}}} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+        self._connection().execute('DELETE FROM metrics')
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    """Метрики по текущим настройкам или `None`, если они отключены."""
+    if not settings.METRICS_FILE:
+        return None
+    key = (
+        settings.METRICS_FILE,
+        tuple(settings.METRICS_BUCKETS),
+        settings.METRICS_FLUSH_INTERVAL,
+    )
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = Metrics(*key)
+        return _registry[key]
+
+
+def route_name(request):
+    """Имя маршрута запроса; для ответов из кеша страниц (до разбора
+    URL) маршрут определяется здесь."""
+    match = request.resolver_match
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """Учитывает каждый запрос в метриках маршрута.
+
+    Ставится первым в `MIDDLEWARE`, чтобы время ответа охватывало и
+    остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.metrics = get_metrics()
+        if self.metrics is None:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        with measure() as timing:
+            response = self.get_response(request)
+        self.metrics.observe(
+            route_name(request), request.method, response.status_code, timing
+        )
+        return response
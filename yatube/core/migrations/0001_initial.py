@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True, verbose_name='Отпечаток')),
+                ('sql', models.TextField(verbose_name='Запрос')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Представление')),
+                ('frame', models.CharField(blank=True, max_length=300, verbose_name='Место вызова')),
+                ('plan', models.TextField(blank=True, verbose_name='План')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Случаев')),
+                ('total_time', models.FloatField(default=0, verbose_name='Всего, с')),
+                ('max_time', models.FloatField(default=0, verbose_name='Дольше всего, с')),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Впервые')),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'медленный запрос',
+                'verbose_name_plural': 'медленные запросы',
+                'ordering': ['-total_time'],
+            },
+        ),
+    ]
@@ -1,3 +1,61 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 
-# Create your models here.
+class SlowQuery(models.Model):
+    """Медленные SQL-запросы, сгруппированные по отпечатку — тексту
+    запроса без значений (`core.slow_queries`).
+
+    Представление, место вызова и план — последнего записанного случая.
+    """
+    fingerprint = models.CharField('Отпечаток', max_length=32, unique=True)
+    sql = models.TextField('Запрос')
+    view = models.CharField('Представление', max_length=200, blank=True)
+    frame = models.CharField('Место вызова', max_length=300, blank=True)
+    plan = models.TextField('План', blank=True)
+    calls = models.PositiveIntegerField('Случаев', default=0)
+    total_time = models.FloatField('Всего, с', default=0)
+    max_time = models.FloatField('Дольше всего, с', default=0)
+    first_seen = models.DateTimeField('Впервые', default=timezone.now)
+    last_seen = models.DateTimeField('Последний раз', default=timezone.now)
+
+    class Meta:
+        ordering = ['-total_time']
+        verbose_name = 'медленный запрос'
+        verbose_name_plural = 'медленные запросы'
+
+    def __str__(self) -> str:
+        return self.sql[:50]
+
+    @property
+    def average_time(self):
+        return self.total_time / self.calls if self.calls else 0
+
+    @classmethod
+    def record(cls, fingerprint, calls, total_time, max_time, **details):
+        """Атомарно прибавляет случаи запроса к его строке."""
+        changes = {
+            'calls': models.F('calls') + calls,
+            'total_time': models.F('total_time') + total_time,
+            'max_time': Greatest(
+                models.F('max_time'),
+                models.Value(max_time, output_field=models.FloatField())
+            ),
+            'last_seen': timezone.now(),
+            **details,
+        }
+        if cls.objects.filter(fingerprint=fingerprint).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    fingerprint=fingerprint,
+                    calls=calls,
+                    total_time=total_time,
+                    max_time=max_time,
+                    **details
+                )
+        except IntegrityError:
+            # Строку только что создал другой процесс
+            cls.objects.filter(fingerprint=fingerprint).update(**changes)
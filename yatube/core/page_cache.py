@@ -0,0 +1,119 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+Вью помечает страницу суррогатными ключами — сущностями, из которых она
+собрана (`post:1`, `author:2`, `group:3`). У каждого ключа в кеше есть
+версия; вместе со страницей сохраняются версии её ключей на момент
+отрисовки. Запись изменений сдвигает версии затронутых ключей, и
+устаревшими становятся ровно те страницы, где эти сущности показаны.
+
+Ключ страницы — адрес без строки запроса и параметры из
+`ANONYMOUS_PAGE_CACHE_PARAMS` в постоянном порядке. Запросы с другими
+параметрами не кешируются: иначе `?x=1`, `?x=2`, ... заводили бы новые
+записи и вытесняли настоящие страницы.
+"""
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import iri_to_uri
+
+from .versions import bump_versions, get_versions
+
+PAGE_KEY = 'page:{}'
+VERSION_KEY = 'surrogate:{}'
+
+
+def _version_keys(keys):
+    return [VERSION_KEY.format(key) for key in keys]
+
+
+def add_surrogate_keys(request, *keys):
+    """Помечает страницу ключами и возвращает их текущие версии.
+
+    Версии запоминаются сразу, до отрисовки: изменение, случившееся во
+    время отрисовки, сделает запись устаревшей. Запросы, которые кеш не
+    сохранит, только получают версии.
+    """
+    versions = get_versions(_version_keys(keys))
+    versions = {key: versions[VERSION_KEY.format(key)] for key in keys}
+    if getattr(request, 'page_cacheable', False):
+        request.surrogate_keys.update(versions)
+    return versions
+
+
+def purge_surrogate_keys(*keys):
+    """Сбрасывает все закешированные страницы, помеченные ключами."""
+    bump_versions(*_version_keys(keys))
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимам сохранённые страницы, помеченные суррогатными
+    ключами. Страницы без ключей, ответы с cookie, неуспешные и
+    потоковые ответы не кешируются.
+
+    Ставится после `AuthenticationMiddleware`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timeout = settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+        self.params = settings.ANONYMOUS_PAGE_CACHE_PARAMS
+
+    def __call__(self, request):
+        if not self.cacheable_request(request):
+            return self.get_response(request)
+        cache_key = self.cache_key(request)
+        response = self.cached_response(cache_key)
+        if response is not None:
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        request.page_cacheable = True
+        request.surrogate_keys = {}
+        response = self.get_response(request)
+        if self.cacheable_response(request, response):
+            response['Surrogate-Key'] = ' '.join(request.surrogate_keys)
+            response['X-Page-Cache'] = 'miss'
+            cache.set(
+                cache_key,
+                (request.surrogate_keys, response),
+                self.timeout
+            )
+        return response
+
+    def cacheable_request(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and set(request.GET) <= set(self.params)
+        )
+
+    def cache_key(self, request):
+        query = urlencode(sorted(
+            (name, value) for name, values in request.GET.lists()
+            for value in values
+        ))
+        return PAGE_KEY.format(iri_to_uri(
+            request.build_absolute_uri(request.path) + f'?{query}'
+        ))
+
+    def cacheable_response(self, request, response):
+        return (
+            request.surrogate_keys
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
+
+    def cached_response(self, cache_key):
+        entry = cache.get(cache_key)
+        if entry is None:
+            return None
+        keys, response = entry
+        version_keys = _version_keys(keys)
+        current = cache.get_many(version_keys)
+        for key, version_key in zip(keys, version_keys):
+            if current.get(version_key) != keys[key]:
+                return None
+        return response
@@ -0,0 +1,169 @@
+"""Журнал медленных SQL-запросов без `DEBUG` и debug-toolbar.
+
+`SlowQueryMiddleware` оборачивает курсоры всех баз на время запроса и
+берёт на заметку SQL-запросы дольше `SLOW_QUERY_THRESHOLD` секунд (из
+них — долю `SLOW_QUERY_SAMPLE_RATE`). Для каждого сохраняются текст
+без значений, представление, строка кода проекта, откуда он сделан, и
+план `EXPLAIN QUERY PLAN` (для SELECT). После ответа случаи
+прибавляются к строкам `SlowQuery` по отпечатку — таблица видна в
+админке. Значения параметров не сохраняются: в них бывают личные данные.
+
+Без `SLOW_QUERY_THRESHOLD` middleware отключена.
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, NotSupportedError, connections
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+# Свои кадры и кадры обёрток курсора пропускаются при поиске места вызова
+_SKIP_FILES = {
+    os.path.splitext(os.path.abspath(__file__))[0],
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timing'),
+}
+
+
+def normalize(sql):
+    """Текст запроса без значений: строки, числа и параметры — `?`,
+    списки `IN (?, ?, ...)` и строки `VALUES` любой длины — `(...)`."""
+    sql = _STRING.sub('?', sql).replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _LISTS.sub('(...)', _LIST.sub('(...)', sql))
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(sql.encode()).hexdigest()
+
+
+def caller():
+    """Ближайшая к запросу строка кода проекта: `posts/views.py:42 in
+    index`."""
+    root = os.path.join(settings.BASE_DIR, '')
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(root)
+            and 'site-packages' not in filename
+            and os.path.splitext(filename)[0] not in _SKIP_FILES
+        ):
+            return '{}:{} in {}'.format(
+                os.path.relpath(filename, root), frame.f_lineno,
+                frame.f_code.co_name
+            )
+        frame = frame.f_back
+    return ''
+
+
+def explain(connection, sql, params):
+    """План запроса строками, вложенные шаги — с отступом."""
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except (DatabaseError, NotSupportedError):
+        return ''
+    if rows and len(rows[0]) == 4:
+        # SQLite: (id, parent, notused, detail)
+        depths = {}
+        lines = []
+        for id, parent, _, detail in rows:
+            depths[id] = depths.get(parent, -1) + 1
+            lines.append('  ' * depths[id] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+class SlowQueryRecorder:
+    """Обёртка курсора (`execute_wrapper`) на время одного запроса."""
+
+    def __init__(self, request, threshold, sample_rate):
+        self.request = request
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        # отпечаток -> [случаев, время, максимум, подробности]
+        self.queries = {}
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        result = execute(sql, params, many, context)
+        duration = perf_counter() - start
+        if (
+            duration >= self.threshold
+            and not self.explaining
+            and random.random() < self.sample_rate
+        ):
+            self.capture(sql, params, many, context['connection'], duration)
+        return result
+
+    def capture(self, sql, params, many, connection, duration):
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        match = self.request.resolver_match
+        details = {
+            'sql': normalized,
+            'view': match.view_name if match else '',
+            'frame': caller()[:300],
+            'plan': '',
+        }
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.explaining = True
+            try:
+                details['plan'] = explain(connection, sql, params)
+            finally:
+                self.explaining = False
+        entry = self.queries.setdefault(key, [0, 0.0, 0.0, details])
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] = max(entry[2], duration)
+        entry[3] = details
+
+    def save(self):
+        for key, (calls, total, longest, details) in self.queries.items():
+            SlowQuery.record(key, calls, total, longest, **details)
+
+
+class SlowQueryMiddleware:
+    """Записывает медленные SQL-запросы в `SlowQuery`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = settings.SLOW_QUERY_THRESHOLD
+        if self.threshold is None:
+            raise MiddlewareNotUsed
+        self.sample_rate = settings.SLOW_QUERY_SAMPLE_RATE
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(
+            request, self.threshold, self.sample_rate
+        )
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        if recorder.queries:
+            # Уже вне транзакций представления: откат не унесёт запись
+            try:
+                recorder.save()
+            except DatabaseError:
+                logger.exception('Не удалось записать медленные запросы')
+        return response
@@ -0,0 +1,16 @@
+"""Рабочий профиль SQLite.
+
+`apply_pragmas` выполняет прагмы `SQLITE_PRAGMAS` на каждом новом
+соединении (сигнал `connection_created`), а движок `core.sqlite`
+(`base.py`) начинает транзакции с `BEGIN IMMEDIATE`. Профиль включается
+переменной окружения `YATUBE_DB_PROFILE=production`; его прагмы —
+`SQLITE_PRODUCTION_PRAGMAS` в настройках.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,10 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        # Отложенная транзакция, начавшись с чтения, не ждёт блокировку
+        # записи по busy_timeout: при занятой базе SQLite сразу отвечает
+        # «database is locked». IMMEDIATE берёт блокировку в начале.
+        self.cursor().execute('BEGIN IMMEDIATE')
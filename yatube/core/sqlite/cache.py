@@ -0,0 +1,234 @@
+"""Кеш в файле SQLite, общий для всех процессов сервера.
+
+`LocMemCache` у каждого процесса свой: версии лент, кеш страниц и
+фрагментов, сброшенные в одном процессе, остаются в остальных. Этот
+бэкенд хранит записи в одной таблице файла SQLite в режиме WAL, поэтому
+их видят все процессы машины без отдельного сервиса.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.sqlite.cache.SQLiteCache',
+        'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }}
+
+При переполнении `MAX_ENTRIES` (проверяется раз в `CULL_INTERVAL`
+записей, так что предел может ненадолго превышаться) сначала удаляются
+просроченные записи, затем давно не читанные (LRU по времени последнего
+чтения с точностью `ACCESS_RESOLUTION`). `incr`, `add` и вытеснение
+идут в транзакции `BEGIN IMMEDIATE` и атомарны между процессами.
+"""
+import pickle
+from contextlib import contextmanager
+from time import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .connection import LocalConnection
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+)
+# Ограничение SQLite на число параметров запроса
+CHUNK_SIZE = 900
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+class SQLiteCache(BaseCache):
+    # Время чтения обновляется не чаще, чем раз в столько секунд, и
+    # копится в процессе до ACCESS_BATCH ключей или ближайшей записи:
+    # иначе каждое чтение было бы записью в базу
+    ACCESS_RESOLUTION = 1.0
+    ACCESS_BATCH = 100
+    BUSY_TIMEOUT = 5.0
+    # Число записей проверяется раз на столько записей в соединении:
+    # COUNT(*) по большой таблице дороже самой записи
+    CULL_INTERVAL = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._connection = LocalConnection(
+            location, SCHEMA, self.BUSY_TIMEOUT, setup=self._setup
+        )
+        self._local = self._connection.local
+
+    @staticmethod
+    def _setup(local):
+        local.writes = 0
+        local.accessed = {}
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция, сразу берущая блокировку записи."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _live(self, row, now):
+        return row is not None and (row[0] is None or row[0] > now)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        connection = self._connection()
+        now = time()
+        found = {}
+        for chunk in _chunks(keys):
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[keys[key]] = pickle.loads(value)
+                if now - accessed >= self.ACCESS_RESOLUTION:
+                    self._local.accessed[key] = now
+        if len(self._local.accessed) >= self.ACCESS_BATCH:
+            with self._transaction() as connection:
+                self._flush_accessed(connection)
+        return found
+
+    def _flush_accessed(self, connection):
+        """Записывает накопленное время чтения одной пачкой."""
+        accessed = self._local.accessed
+        if accessed:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(when, key) for key, when in accessed.items()]
+            )
+            accessed.clear()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time()
+        rows = [
+            (
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires,
+                now,
+            )
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', rows
+            )
+            self._cull(connection, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if self._live(row, now):
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                    now,
+                )
+            )
+            self._cull(connection, now)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        db_key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT expires, value FROM cache WHERE key = ?', (db_key,)
+            ).fetchone()
+            if not self._live(row, time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[1]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), db_key)
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time())
+        )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),)
+        ).fetchone()
+        return self._live(row, time())
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        connection = self._connection()
+        for chunk in _chunks(self._key(key, version) for key in keys):
+            connection.execute(
+                f'DELETE FROM cache WHERE key IN '
+                f'({", ".join("?" * len(chunk))})',
+                chunk
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _cull(self, connection, now):
+        self._flush_accessed(connection)
+        self._local.writes += 1
+        if self._local.writes % self.CULL_INTERVAL:
+            return
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        count -= connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (now,)
+        ).rowcount
+        if count <= self._max_entries:
+            return
+        # Как и у встроенных бэкендов, освобождается доля записей сверх
+        # предела, чтобы не вытеснять по одной на каждой записи
+        excess = count - self._max_entries + count // self._cull_frequency
+        connection.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (excess,)
+        )
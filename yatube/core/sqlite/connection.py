@@ -0,0 +1,39 @@
+"""Соединения с файлами SQLite, общими для процессов сервера (кеш,
+метрики)."""
+import os
+import sqlite3
+import threading
+
+
+class LocalConnection:
+    """Соединение с файлом SQLite в режиме WAL, своё у каждого потока и
+    каждого процесса: после fork унаследованное соединение использовать
+    нельзя.
+
+    `schema` выполняется на каждом новом соединении и должна создавать
+    таблицы через `IF NOT EXISTS`. `setup(local)` заводит данные потока,
+    которые живут столько же, сколько соединение; они хранятся в `local`.
+    """
+
+    def __init__(self, path, schema=(), timeout=5.0, setup=None):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self.setup = setup
+        self.local = threading.local()
+
+    def __call__(self):
+        local = self.local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            for statement in self.schema:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+            if self.setup is not None:
+                self.setup(local)
+        return local.connection
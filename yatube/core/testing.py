@@ -0,0 +1,48 @@
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget(ContextDecorator):
+    """Падает, если блок кода выполнил больше `limit` SQL-запросов.
+
+    Работает и как контекстный менеджер, и как декоратор теста:
+
+        with query_budget(3):
+            client.get('/')
+
+        @query_budget(3)
+        def test_index(self): ...
+    """
+
+    def __init__(self, limit, using=DEFAULT_DB_ALIAS):
+        self.limit = limit
+        self.using = using
+
+    def __enter__(self):
+        self.captured = CaptureQueriesContext(connections[self.using])
+        self.captured.__enter__()
+        return self.captured
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.captured.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.captured)
+        if executed > self.limit:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(
+                    self.captured.captured_queries, start=1
+                )
+            )
+            raise QueryBudgetExceeded(
+                f'Выполнено {executed} запросов при бюджете {self.limit}:'
+                f'\n{queries}'
+            )
+        return False
@@ -0,0 +1,514 @@
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import sleep, time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import resolve, reverse
+
+from posts.models import Group, Post
+from .metrics import get_metrics
+from .models import SlowQuery
+from .slow_queries import normalize
+from .sqlite.cache import SQLiteCache
+from .timing import RequestTiming
+from .versions import get_versions
+from .background import BackgroundPool
+from .db_routing import (PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware,
+                         note_modified, note_write)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_LAG=5)
+class ReplicaRoutingTest(SimpleTestCase):
+    """Проверка выбора базы для чтения"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_view(self, url, method='get', write=False, note=False,
+                 modified=None, versions=(), **cookies):
+        """Проводит запрос через middleware; возвращает ответ и базы,
+        с которых читало «представление» до и после своих действий."""
+        aliases = []
+
+        def view(request):
+            aliases.append(self.router.db_for_read(Post))
+            if modified is not None:
+                note_modified(modified)
+            if versions:
+                get_versions(versions)
+            if write:
+                self.router.db_for_write(Post)
+            if note:
+                note_write()
+            aliases.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)(url)
+        request.COOKIES.update(cookies)
+        request.resolver_match = resolve(url)
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: middleware.process_view(
+                request, view, (), {}
+            ) or view(request)
+        )
+        return middleware(request), aliases
+
+    def test_read_views_use_replica(self):
+        for url in (
+            reverse('posts:main'),
+            reverse('posts:profile', args=['author']),
+            reverse('posts:post_detail', args=[1]),
+        ):
+            with self.subTest(url=url):
+                response, aliases = self.run_view(url)
+                self.assertEqual(aliases, ['replica1', 'replica1'])
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views_use_primary(self):
+        _, aliases = self.run_view(reverse('posts:post_create'))
+        self.assertEqual(aliases, [DEFAULT_DB_ALIAS] * 2)
+        _, aliases = self.run_view(reverse('posts:main'), method='post')
+        self.assertEqual(aliases, [DEFAULT_DB_ALIAS] * 2)
+
+    def test_write_pins_client_to_primary(self):
+        """После записи клиент читает свои изменения с основной базы"""
+        url = reverse('posts:profile', args=['author'])
+        response, aliases = self.run_view(url, write=True, note=True)
+        self.assertEqual(aliases, ['replica1', DEFAULT_DB_ALIAS])
+        pin = response.cookies[PIN_COOKIE].value
+        _, aliases = self.run_view(url, **{PIN_COOKIE: pin})
+        self.assertEqual(aliases, [DEFAULT_DB_ALIAS] * 2)
+        _, aliases = self.run_view(url, **{PIN_COOKIE: str(int(time()))})
+        self.assertEqual(aliases, ['replica1', 'replica1'])
+
+    def test_service_write_does_not_pin(self):
+        """Служебная запись (сессия, кеш миниатюр) читается с основной
+        базы до конца запроса, но клиента не закрепляет"""
+        url = reverse('posts:profile', args=['author'])
+        response, aliases = self.run_view(url, write=True)
+        self.assertEqual(aliases, ['replica1', DEFAULT_DB_ALIAS])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response, _ = self.run_view(url, method='post')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_versions_route_fresh_reads_to_primary(self):
+        """Чтение свежей версии переключает запрос на основную базу"""
+        url = reverse('posts:main')
+        cache.delete('replica-test-version')
+        _, aliases = self.run_view(url, versions=['replica-test-version'])
+        self.assertEqual(aliases, ['replica1', DEFAULT_DB_ALIAS])
+
+    def test_fresh_data_read_from_primary(self):
+        """Только что изменённые данные реплика могла не получить"""
+        url = reverse('posts:main')
+        _, aliases = self.run_view(url, modified=time() - 1)
+        self.assertEqual(aliases, ['replica1', DEFAULT_DB_ALIAS])
+        _, aliases = self.run_view(url, modified=time() - 60)
+        self.assertEqual(aliases, ['replica1', 'replica1'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        _, aliases = self.run_view(reverse('posts:main'))
+        self.assertEqual(aliases, [DEFAULT_DB_ALIAS] * 2)
+
+
+def _increment(cache, times):
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class BackgroundPoolTest(SimpleTestCase):
+    """Проверка фонового пула"""
+
+    @override_settings(TEST_WORKERS=0)
+    def test_inline_without_workers(self):
+        pool = BackgroundPool('TEST_WORKERS', 'test')
+        self.assertEqual(pool.submit(sum, [1, 2]), 3)
+        self.assertIsNone(pool._executor)
+
+    @override_settings(TEST_WORKERS=1)
+    def test_runs_in_pool(self):
+        pool = BackgroundPool('TEST_WORKERS', 'test')
+        future = pool.submit(sum, [1, 2])
+        self.assertEqual(future.result(), 3)
+        self.assertIs(pool.submit(sum, []).result(), 0)
+        pool._executor.shutdown()
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    """Проверка общего для процессов кеша в SQLite"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.workdir, 'cache.sqlite3'),
+            {'OPTIONS': options}
+        )
+
+    def test_cache_api(self):
+        cache = self.cache
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete_many(['a', 'b'])
+        self.assertFalse(cache.has_key('a'))
+        cache.set('expired', 'value', 0)
+        self.assertIsNone(cache.get('expired'))
+        self.assertTrue(cache.add('expired', 'again'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому с тем же файлом"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные записи"""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=10)
+        cache.ACCESS_RESOLUTION = 0
+        cache.CULL_INTERVAL = 1
+        for key in 'abc':
+            cache.set(key, key)
+            sleep(0.01)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(sorted(cache.get_many('abcd')), ['a', 'c', 'd'])
+
+    def test_incr_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.cache, 200))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 800)
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+class ServerTimingTest(TestCase):
+    """Проверка заголовка Server-Timing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user(username='timing')
+        group = Group.objects.create(title='Группа', slug='timing')
+        Post.objects.create(text='Текст', author=author, group=group)
+        cls.staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def timings(self, response):
+        """Участки заголовка: имя -> описание и длительность."""
+        parts = {}
+        for part in response['Server-Timing'].split(', '):
+            name, *params = part.split(';')
+            parts[name] = dict(param.split('=', 1) for param in params)
+        return parts
+
+    def test_header(self):
+        """Заголовок содержит SQL, шаблоны, кеш и общее время"""
+        timings = self.timings(self.client.get(reverse('posts:main')))
+        self.assertEqual(
+            list(timings), ['db', 'tpl', 'cache', 'thumb', 'app', 'total']
+        )
+        self.assertRegex(timings['db']['desc'], r'^"[1-9]\d* SQL"$')
+        self.assertRegex(
+            timings['cache']['desc'], r'^"\d+ hit / [1-9]\d* miss"$'
+        )
+        self.assertGreater(float(timings['tpl']['dur']), 0)
+        durations = [
+            float(timing['dur']) for name, timing in timings.items()
+            if name != 'total'
+        ]
+        # Участки не пересекаются: в сумме не больше общего времени с
+        # поправкой на округление
+        self.assertLessEqual(
+            sum(durations), float(timings['total']['dur']) + 0.5
+        )
+
+    @override_settings(DEBUG=True)
+    def test_cached_page(self):
+        """Страница из кеша не ходит в базу"""
+        self.client.logout()
+        self.client.get(reverse('posts:main'))
+        timings = self.timings(self.client.get(reverse('posts:main')))
+        self.assertEqual(timings['db']['desc'], '"0 SQL"')
+        self.assertRegex(
+            timings['cache']['desc'], r'^"[1-9]\d* hit / 0 miss"$'
+        )
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_disabled(self):
+        """При нулевой доле заголовка нет"""
+        response = self.client.get(reverse('posts:main'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_TIMING_LOG=True)
+    def test_log(self):
+        """Замер пишется в лог строкой JSON для всех, а заголовок видят
+        только сотрудники"""
+        self.client.logout()
+        with self.assertLogs('core.timing') as logs:
+            response = self.client.get(reverse('posts:main'))
+        self.assertNotIn('Server-Timing', response)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:main')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('total_ms', record)
+
+
+class MetricsTest(TestCase):
+    """Проверка метрик маршрутов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.workdir = tempfile.mkdtemp()
+        cls.overrides = override_settings(
+            METRICS_FILE=os.path.join(cls.workdir, 'metrics.sqlite3'),
+            METRICS_FLUSH_INTERVAL=60,
+            METRICS_BUCKETS=(0.1, 1),
+            METRICS_TOKEN='secret',
+        )
+        cls.overrides.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.overrides.disable()
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user(username='metrics')
+        Post.objects.create(text='Текст', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.metrics = get_metrics()
+        self.metrics.clear()
+
+    def scrape(self):
+        """Метрики со страницы: строка без значения -> значение."""
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                sample, value = line.rsplit(' ', 1)
+                samples[sample] = float(value)
+        return samples
+
+    def test_route_metrics(self):
+        """Запросы, гистограмма, SQL и кеш считаются по маршруту"""
+        for _ in range(2):
+            self.client.get(reverse('posts:main'))
+        samples = self.scrape()
+        route = '{view="posts:main"}'
+        self.assertEqual(samples[
+            'yatube_requests_total'
+            '{view="posts:main",method="GET",status="200"}'
+        ], 2)
+        self.assertEqual(
+            samples['yatube_request_duration_seconds_count' + route], 2
+        )
+        self.assertEqual(samples[
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:main",le="+Inf"}'
+        ], 2)
+        self.assertLessEqual(
+            samples['yatube_request_duration_seconds_bucket'
+                    '{view="posts:main",le="0.1"}'],
+            samples['yatube_request_duration_seconds_bucket'
+                    '{view="posts:main",le="1"}'],
+        )
+        self.assertGreater(samples['yatube_db_queries_total' + route], 0)
+        # Вторая страница отдана из кеша страниц
+        self.assertGreater(samples['yatube_cache_hits_total' + route], 0)
+        self.assertGreater(samples['yatube_cache_misses_total' + route], 0)
+
+    def test_unknown_url(self):
+        """Неизвестные адреса не плодят маршрутов"""
+        self.client.get('/unknown/address/')
+        samples = self.scrape()
+        self.assertEqual(samples[
+            'yatube_requests_total'
+            '{view="unmatched",method="GET",status="404"}'
+        ], 1)
+
+    def test_shared_between_processes(self):
+        """Метрики других процессов попадают в общую сумму"""
+        context = multiprocessing.get_context('fork')
+
+        def worker():
+            get_metrics().observe('posts:main', 'GET', 200, RequestTiming())
+            get_metrics().flush()
+
+        processes = [context.Process(target=worker) for _ in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        samples = self.scrape()
+        self.assertEqual(samples[
+            'yatube_requests_total'
+            '{view="posts:main",method="GET",status="200"}'
+        ], 3)
+
+    def test_unknown_method(self):
+        """Нестандартные методы учитываются как other"""
+        self.client.generic('FOO', reverse('posts:main'))
+        methods = {
+            sample for sample in self.scrape()
+            if sample.startswith('yatube_requests_total')
+        }
+        self.assertTrue(any('method="other"' in name for name in methods))
+        self.assertFalse(any('method="FOO"' in name for name in methods))
+
+    def test_internal_only(self):
+        """Страницу метрик видят сборщик с токеном и сотрудники, но не
+        клиенты с локального адреса (так приходят запросы через nginx)"""
+        url = reverse('metrics')
+        response = self.client.get(url, REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=None):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(get_user_model().objects.create_user(
+            username='staff', is_staff=True
+        ))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(METRICS_FILE=None):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_SAMPLE_RATE=1)
+class SlowQueryTest(TestCase):
+    """Проверка журнала медленных запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user(username='slow')
+        Post.objects.create(text='Текст', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_normalize(self):
+        """Значения и списки разной длины дают один текст"""
+        self.assertEqual(
+            normalize("SELECT * FROM t  WHERE a = 'x''y' AND b IN (1, 2)"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...)'
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM t2 WHERE id IN (%s, %s, %s) LIMIT 21'),
+            normalize('SELECT * FROM t2 WHERE id IN (%s) LIMIT 10'),
+        )
+        self.assertEqual(
+            normalize('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO t VALUES (...)'
+        )
+
+    def test_recorded(self):
+        """Запросы записываются с представлением, местом вызова и планом"""
+        self.client.get(reverse('posts:main'))
+        query = SlowQuery.objects.get(
+            view='posts:main', sql__contains='FROM "posts_post"'
+        )
+        self.assertEqual(query.calls, 1)
+        self.assertRegex(query.frame, r'^posts/\w+\.py:\d+ in \w+$')
+        self.assertIn('post_pub_date_idx', query.plan)
+        self.assertNotIn('%s', query.sql)
+        # Собственные записи и EXPLAIN не попадают в журнал
+        self.assertFalse(SlowQuery.objects.filter(
+            sql__contains='core_slowquery'
+        ).exists())
+        self.assertFalse(SlowQuery.objects.filter(
+            sql__startswith='EXPLAIN'
+        ).exists())
+
+    def test_aggregated(self):
+        """Повторы одного запроса складываются в одну строку"""
+        url = reverse('posts:profile', args=['slow'])
+        self.client.get(url)
+        before = {
+            query.fingerprint: query.calls
+            for query in SlowQuery.objects.filter(view='posts:profile')
+        }
+        cache.clear()
+        self.client.get(url)
+        after = {
+            query.fingerprint: query.calls
+            for query in SlowQuery.objects.filter(view='posts:profile')
+        }
+        self.assertEqual(set(before), set(after))
+        for key, calls in before.items():
+            self.assertEqual(after[key], calls * 2)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60)
+    def test_threshold(self):
+        """Быстрые запросы не записываются"""
+        self.client.get(reverse('posts:main'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class BenchLoadTest(SimpleTestCase):
+    """Проверка, что бенчмарк обходит все адреса"""
+
+    def test_smoke(self):
+        """Прогон на крошечном наборе данных: новый аргумент адреса без
+        значения в `samples()` остановит команду"""
+        # Команда сама создаёт одноразовую базу, поэтому запускается
+        # отдельным процессом, а не внутри тестовой базы
+        result = subprocess.run(
+            [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, 'manage.py'),
+                'bench_load', '--users', '6', '--groups', '2',
+                '--posts', '20', '--comments', '10', '--follows', '2',
+                '--images', '1', '--viewers', '2', '--requests', '1',
+                '--warmup', '0',
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('posts:index_feed', result.stdout)
@@ -0,0 +1,244 @@
+"""Замер того, на что ушло время запроса: SQL, шаблоны, кеш, миниатюры
+и собственно Python.
+
+`RequestTimingMiddleware` замеряет долю запросов
+`REQUEST_TIMING_SAMPLE_RATE` и при `REQUEST_TIMING_LOG` пишет итог
+строкой JSON в лог `core.timing`. Заголовок `Server-Timing` (виден во
+вкладке Network браузера) получают только сотрудники, а при `DEBUG` —
+все: посторонним незачем знать, во что обходится страница. При нулевой
+доле middleware отключается целиком, а перехватчики не ставятся.
+
+Время считается без вложенных участков: запросы к базе, сделанные при
+отрисовке шаблона, идут в `db`, а не в `tpl`; остаток — `app`.
+Свои участки отмечаются через `span`:
+
+    with span('thumb'):
+        get_thumbnail(...)
+"""
+import json
+import logging
+import random
+import threading
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+_MISSING = object()
+# Порядок участков в заголовке
+SPANS = ('db', 'tpl', 'cache', 'thumb')
+
+
+class RequestTiming:
+    """Время участков и счётчики одного запроса."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.spans = defaultdict(float)
+        self.counts = Counter()
+        # Стек открытых участков: [имя, время вложенных участков]
+        self.stack = []
+
+    def inside(self, name):
+        return bool(self.stack) and self.stack[-1][0] == name
+
+    @contextmanager
+    def span(self, name):
+        frame = [name, 0.0]
+        self.stack.append(frame)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.stack.pop()
+            self.spans[name] += elapsed - frame[1]
+            if self.stack:
+                self.stack[-1][1] += elapsed
+
+    def total(self):
+        return perf_counter() - self.started
+
+    def summary(self):
+        total = self.total()
+        spans = {name: self.spans.get(name, 0.0) for name in SPANS}
+        spans['app'] = max(0.0, total - sum(self.spans.values()))
+        spans['total'] = total
+        return spans
+
+    def header(self):
+        descriptions = {
+            'db': f'{self.counts["queries"]} SQL',
+            'cache': (
+                f'{self.counts["cache_hits"]} hit / '
+                f'{self.counts["cache_misses"]} miss'
+            ),
+        }
+        parts = []
+        for name, duration in self.summary().items():
+            part = f'{name};dur={duration * 1000:.1f}'
+            if name in descriptions:
+                part += f';desc="{descriptions[name]}"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+def current():
+    """Замер текущего запроса или `None`, если запрос не замеряется."""
+    return getattr(_state, 'timing', None)
+
+
+@contextmanager
+def span(name):
+    """Отмечает участок кода; вне замера ничего не делает."""
+    timing = current()
+    if timing is None:
+        yield
+        return
+    with timing.span(name):
+        yield
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timing = current()
+    if timing is None:
+        return execute(sql, params, many, context)
+    timing.counts['queries'] += 1
+    with timing.span('db'):
+        return execute(sql, params, many, context)
+
+
+def _timed_render(render):
+    def timed(self, context):
+        timing = current()
+        if timing is None:
+            return render(self, context)
+        with timing.span('tpl'):
+            return render(self, context)
+    return timed
+
+
+def _timed_get(get):
+    def timed(self, key, default=None, version=None):
+        timing = current()
+        # Бэкенды выражают get через get_many и наоборот: считаем только
+        # внешний вызов
+        if timing is None or timing.inside('cache'):
+            return get(self, key, default, version)
+        with timing.span('cache'):
+            value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            timing.counts['cache_misses'] += 1
+            return default
+        timing.counts['cache_hits'] += 1
+        return value
+    return timed
+
+
+def _timed_get_many(get_many):
+    def timed(self, keys, version=None):
+        timing = current()
+        if timing is None or timing.inside('cache'):
+            return get_many(self, keys, version)
+        keys = list(keys)
+        with timing.span('cache'):
+            found = get_many(self, keys, version)
+        timing.counts['cache_hits'] += len(found)
+        timing.counts['cache_misses'] += len(keys) - len(found)
+        return found
+    return timed
+
+
+@contextmanager
+def measure():
+    """Замеряет код внутри блока; если запрос уже замеряется (например,
+    внешней middleware), отдаёт его замер."""
+    timing = current()
+    if timing is not None:
+        yield timing
+        return
+    install()
+    timing = _state.timing = RequestTiming()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(_sql_wrapper)
+                )
+            yield timing
+    finally:
+        _state.timing = None
+
+
+_installed = False
+
+
+def install():
+    """Ставит перехватчики отрисовки шаблонов и чтения кешей, один раз."""
+    global _installed
+    if _installed:
+        return
+    Template.render = _timed_render(Template.render)
+    backends = {
+        import_string(config['BACKEND'])
+        for config in settings.CACHES.values()
+    }
+    for backend in backends:
+        backend.get = _timed_get(backend.get)
+        backend.get_many = _timed_get_many(backend.get_many)
+    _installed = True
+
+
+class RequestTimingMiddleware:
+    """Заголовок `Server-Timing` и строка в лог для доли запросов.
+
+    Ставится первым в `MIDDLEWARE`, чтобы замер охватывал и остальные
+    middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.log = settings.REQUEST_TIMING_LOG
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        with measure() as timing:
+            response = self.get_response(request)
+        if self.show_header(request):
+            response['Server-Timing'] = timing.header()
+        if self.log:
+            self.write_log(request, response, timing)
+        return response
+
+    @staticmethod
+    def show_header(request):
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    def write_log(self, request, response, timing):
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timing.counts['queries'],
+            'cache_hits': timing.counts['cache_hits'],
+            'cache_misses': timing.counts['cache_misses'],
+            **{
+                f'{name}_ms': round(duration * 1000, 2)
+                for name, duration in timing.summary().items()
+            },
+        }))
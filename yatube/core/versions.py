@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from time import time
+
+from django.core.cache import cache
+from django.dispatch import Signal
+
+# Версии прочитаны; `modified` — время самой свежей из них в секундах
+versions_read = Signal(providing_args=['modified'])
+
+
+def _initial_version():
+    # Версия, потерянная при вытеснении из кеша, начинается заново
+    # со времени в микросекундах и не совпадает ни с одной прежней.
+    return int(time() * 1_000_000)
+
+
+def get_versions(keys):
+    """Текущие версии счётчиков `keys` одним походом в кеш."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    if versions:
+        versions_read.send(
+            sender=None, modified=max(versions.values()) / 1_000_000
+        )
+    return versions
+
+
+def bump_versions(*keys):
+    """Сдвигает версии: всё, что закешировано под старыми версиями,
+    больше не используется и со временем вытесняется.
+
+    Новая версия не меньше текущего времени в микросекундах, поэтому
+    версия заодно служит временем последнего изменения
+    (`versions_modified`).
+    """
+    now = _initial_version()
+    for key in keys:
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            cache.set(key, now, None)
+        else:
+            if version < now:
+                cache.set(key, now, None)
+
+
+def versions_modified(versions):
+    """Время последнего изменения по словарю версий."""
+    return datetime.fromtimestamp(
+        max(versions.values()) / 1_000_000, tz=timezone.utc
+    )
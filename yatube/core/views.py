@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
+
+from .metrics import CONTENT_TYPE, get_metrics
 
 
 def page_not_found(request, exception):
@@ -7,3 +13,24 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_allowed(request):
+    """Метрики видят сотрудники и сборщик с токеном `METRICS_TOKEN` в
+    заголовке `Authorization: Bearer`. Адресу клиента верить нельзя:
+    за nginx все запросы приходят с 127.0.0.1."""
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+@never_cache
+def metrics(request):
+    """Метрики для Prometheus."""
+    metrics = get_metrics()
+    if metrics is None or not metrics_allowed(request):
+        raise Http404
+    metrics.flush()
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
@@ -1,20 +1,112 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME, ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django import forms
+from django.template.response import TemplateResponse
 
+from .bulk import delete_posts, reassign_group
 from .models import Post, Group
+from .paginator import CappedCountPaginator
+from .search import filter_posts
+
+
+class PostActionForm(ActionForm):
+    # Группа для действия «перенести в группу»; виджет с автодополнением
+    # не выводит в страницу список всех групп
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        required=False,
+        label='Группа',
+        widget=AutocompleteSelect(
+            Post._meta.get_field('group').remote_field, admin.site
+        )
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
     # Перечисляем поля, которые должны отображаться в админке
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    # Автор и группа подгружаются тем же запросом, что и посты.
+    # Группа меняется действием «Перенести в группу»: редактируемая
+    # колонка выводила бы виджет и запрос к базе на каждую строку
+    list_select_related = ('author', 'group')
     # Добавляем интерфейс для поиска по тексту постов
-    list_editable = ('group',)
     search_fields = ('text',)
     # Добавляем возможность фильтрации по дате
     list_filter = ('pub_date',)
+    # Навигация по датам опирается на индекс по pub_date
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    # Без полного COUNT(*) таблицы на каждую страницу списка
+    show_full_result_count = False
+    paginator = CappedCountPaginator
+    action_form = PostActionForm
+    actions = ('reassign_group', 'delete_posts')
     empty_value_display = '-пусто-'
 
+    def get_actions(self, request):
+        # Стандартное удаление грузит все объекты и шлёт сигналы по одному
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу, а не LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
+    def reassign_group(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            self.message_user(
+                request, 'Выберите существующую группу.', messages.ERROR
+            )
+            return
+        group = form.cleaned_data['group']
+        total = reassign_group(queryset, group)
+        self.message_user(
+            request,
+            f'Перенесено постов: {total} в группу «{group or "без группы"}».'
+        )
+    reassign_group.short_description = 'Перенести в группу'
+    reassign_group.allowed_permissions = ('change',)
+
+    def delete_posts(self, request, queryset):
+        # Как и стандартное удаление, сначала спрашиваем подтверждение:
+        # с «выбрать все» одно нажатие удалило бы всю таблицу
+        if request.POST.get('post') != 'yes':
+            limit = CappedCountPaginator.count_limit
+            count = queryset.order_by().values('pk')[:limit + 1].count()
+            return TemplateResponse(
+                request,
+                'admin/posts/post/delete_posts_confirmation.html',
+                {
+                    **self.admin_site.each_context(request),
+                    'opts': self.model._meta,
+                    'media': self.media,
+                    'count': min(count, limit),
+                    'capped': count > limit,
+                    'select_across': request.POST.get('select_across') == '1',
+                    'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                    'action_checkbox_name': ACTION_CHECKBOX_NAME,
+                }
+            )
+        total = delete_posts(queryset)
+        self.message_user(request, f'Удалено постов: {total}.')
+    delete_posts.short_description = 'Удалить выбранные посты'
+    delete_posts.allowed_permissions = ('delete',)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    # Нужен для автодополнения группы в постах
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,105 @@
+"""Массовые операции над постами пачками запросов.
+
+Сигналы на каждый пост при тысячах строк превращаются в тысячи
+запросов, поэтому здесь строки меняются напрямую, а производные данные
+(счётчики, ленты подписок, кеши) правятся один раз на пачку.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from core.page_cache import purge_surrogate_keys
+from .cache import (ALL_FEEDS, MAIN_PAGE, POST_CARDS, author_key, bump_feeds,
+                    group_key, post_key)
+from .models import Comment, Post, Timeline, UserStats
+
+BATCH_SIZE = 1000
+# Связи постов, которые `delete_posts` убирает сама: (модель, поле).
+# Индекс поиска чистят триггеры базы.
+HANDLED_RELATIONS = {
+    ('posts.Comment', 'post'),
+    ('posts.Timeline', 'post'),
+    ('posts.PostSearchEntry', 'post'),
+}
+
+
+def post_relations():
+    """Связи, ведущие к постам из других моделей."""
+    return {
+        (relation.related_model._meta.label, relation.field.name)
+        for relation in Post._meta.related_objects
+    }
+
+
+def _batches(queryset, batch_size):
+    """Пачки id постов queryset'а с обходом по ключу, без OFFSET."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(pks.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def _purge(rows, *group_ids):
+    """Сбрасывает ленты и страницы, где были показаны посты `rows`."""
+    bump_feeds(ALL_FEEDS)
+    groups = {group_id for _, _, group_id in rows} | set(group_ids)
+    purge_surrogate_keys(
+        MAIN_PAGE,
+        POST_CARDS,
+        *(post_key(pk) for pk, _, _ in rows),
+        *{author_key(author_id) for _, author_id, _ in rows},
+        *(group_key(group_id) for group_id in groups if group_id)
+    )
+
+
+def reassign_group(queryset, group, batch_size=BATCH_SIZE):
+    """Переносит посты в группу `group` (`None` — убрать из групп)."""
+    group_id = group.pk if group else None
+    total = 0
+    for batch in _batches(queryset, batch_size):
+        posts = Post.objects.filter(pk__in=batch)
+        rows = list(posts.values_list('pk', 'author_id', 'group_id'))
+        total += posts.update(group_id=group_id)
+        _purge(rows, group_id)
+    return total
+
+
+def delete_posts(queryset, batch_size=BATCH_SIZE):
+    """Удаляет посты вместе с комментариями и записями лент подписок.
+
+    Строки удаляются без сигналов (`_raw_delete`), а счётчики авторов
+    уменьшаются одним запросом на автора в пачке. Если у постов
+    появилась связь не из `HANDLED_RELATIONS`, удаление идёт обычным
+    `delete()` через сборщик Django, с каскадами и сигналами.
+    """
+    total = 0
+    if post_relations() != HANDLED_RELATIONS:
+        for batch in _batches(queryset, batch_size):
+            with transaction.atomic():
+                _, deleted = Post.objects.filter(pk__in=batch).delete()
+            total += deleted.get(Post._meta.label, 0)
+        return total
+    for batch in _batches(queryset, batch_size):
+        with transaction.atomic():
+            posts = Post.objects.filter(pk__in=batch)
+            rows = list(posts.values_list('pk', 'author_id', 'group_id'))
+            comments = Comment.objects.filter(post_id__in=batch)
+            commenters = comments.values('author_id').annotate(
+                total=Count('pk')
+            ).order_by()
+            for row in commenters:
+                UserStats.bump(row['author_id'], comments_count=-row['total'])
+            authors = posts.values('author_id').annotate(
+                total=Count('pk')
+            ).order_by()
+            for row in authors:
+                UserStats.bump(row['author_id'], posts_count=-row['total'])
+            comments._raw_delete(comments.db)
+            timeline = Timeline.objects.filter(post_id__in=batch)
+            timeline._raw_delete(timeline.db)
+            total += posts._raw_delete(posts.db)
+        _purge(rows)
+    return total
@@ -0,0 +1,120 @@
+import hashlib
+from urllib.parse import urlencode
+
+from core.versions import bump_versions, get_versions
+from .paginator import PAGE_PARAMS
+
+VERSION_KEY = 'feed-version:{}'
+MAIN_FEED = 'main'
+# Общая версия всех лент: меняется, когда правка задевает карточки
+# постов во всех лентах сразу (например, переименование группы).
+ALL_FEEDS = 'all'
+
+
+def feed_versions(feed):
+    """Общая версия всех лент и версия ленты, в этом порядке."""
+    keys = [VERSION_KEY.format(ALL_FEEDS), VERSION_KEY.format(feed)]
+    versions = get_versions(keys)
+    return {key: versions[key] for key in keys}
+
+
+def feed_version(feed, versions=None):
+    """Текущая версия ленты вместе с общей версией всех лент.
+
+    `versions` — версии, из которых собрана лента, если это не одна
+    её собственная версия (как у ленты подписок).
+    """
+    if versions is None:
+        versions = feed_versions(feed)
+    version = '.'.join(str(version) for version in versions.values())
+    if len(versions) > 2:
+        version = hashlib.md5(version.encode()).hexdigest()
+    return version
+
+
+def follow_feed_versions(user_id, author_ids):
+    """Версии ленты подписок читателя.
+
+    Новый или изменённый пост сдвигает версию профиля автора, поэтому
+    лента подписок собирается из версий профилей авторов `author_ids` и
+    своей версии, которая сдвигается при подписке и отписке: публикация
+    поста не пишет в кеш по ключу на каждого подписчика.
+    """
+    keys = [
+        VERSION_KEY.format(ALL_FEEDS),
+        VERSION_KEY.format(follow_feed(user_id)),
+        *(VERSION_KEY.format(profile_feed(author_id))
+          for author_id in author_ids),
+    ]
+    versions = get_versions(keys)
+    return {key: versions[key] for key in keys}
+
+
+def bump_feeds(*feeds):
+    """Сдвигает версии лент, сбрасывая их закешированные страницы."""
+    bump_versions(*(VERSION_KEY.format(feed) for feed in feeds))
+
+
+def feed_cache_key(request, feed, versions=None):
+    """Ключ отрисованной страницы ленты: лента, позиция и версия.
+
+    В позицию идут только параметры страницы: произвольная строка
+    запроса не должна заводить новые записи в кеше.
+    """
+    position = urlencode([
+        (key, request.GET[key]) for key in PAGE_PARAMS if key in request.GET
+    ])
+    return f'{feed}:{feed_version(feed, versions)}:{position}'
+
+
+def feed_count_key(feed):
+    """Ключ оценочного числа постов ленты; версии лент в него не входят,
+    чтобы запись не вызывала пересчёт на следующем же запросе."""
+    return f'feed-count:{feed}'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_card_key(post):
+    """Ключ отрисованной карточки поста.
+
+    В ключ входит всё, что показывает карточка помимо самого поста:
+    группа и время её правки, имя автора. Поэтому правка поста, смена
+    или переименование группы дают новый ключ без явного сброса.
+    """
+    group = post.group
+    parts = (
+        post.modified,
+        group and (group.pk, group.modified),
+        post.author.username,
+    )
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'post-card:{post.pk}:{digest}'
+
+
+# Суррогатные ключи страниц в кеше для анонимов (core.page_cache).
+MAIN_PAGE = 'main'
+# Карточки постов на любой странице: показывают название группы.
+POST_CARDS = 'cards'
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def group_key(group_id):
+    return f'group:{group_id}'
@@ -0,0 +1,31 @@
+"""Отрисованные карточки постов для лент.
+
+Карточка одинакова во всех лентах и не зависит от зрителя, поэтому
+HTML каждой хранится в кеше под `post_card_key`. Страница ленты
+достаёт все карточки одним `get_many` и отрисовывает только
+недостающие.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import post_card_key
+
+TEMPLATE = 'posts/includes/post_card.html'
+
+
+def render_cards(posts):
+    """Список HTML карточек постов `posts` в том же порядке."""
+    posts = list(posts)
+    keys = [post_card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(TEMPLATE, {'post': post})
+        for key, post in zip(keys, posts)
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,45 @@
+"""Кеш графа подписок: отсортированные id авторов, на которых подписан
+пользователь.
+
+Список хранится компактным массивом `array('q')` под ключом
+пользователя и проверяется двоичным поиском, поэтому состояние подписки
+и версии ленты подписок не обращаются к таблице `Follow`. Ключ
+удаляется представлениями подписки и отписки, сигналами `Follow`
+(`posts.signals`) и загрузкой контента (`posts.transfer`).
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from .models import Follow
+
+KEY = 'following:{}'
+
+
+def following_key(user_id):
+    return KEY.format(user_id)
+
+
+def following_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан
+    пользователь."""
+    key = following_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('q', Follow.objects.filter(user_id=user_id).order_by(
+            'author_id'
+        ).values_list('author_id', flat=True))
+        cache.set(key, ids, None)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = following_ids(user_id)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def forget_following(*user_ids):
+    """Сбрасывает закешированные подписки пользователей."""
+    cache.delete_many([following_key(user_id) for user_id in user_ids])
@@ -1,5 +1,10 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+
+from .images import normalize_upload
 from .models import Post, Comment
+from .thumbnails import schedule_thumbnails
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +18,23 @@ class PostForm(forms.ModelForm):
             'image'
         )
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            # Оригинал проверяется и при необходимости пересохраняется
+            # до записи в хранилище
+            image = normalize_upload(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and post.image and 'image' in self.changed_data:
+            # Миниатюры для лент готовятся в фоне сразу после загрузки,
+            # а не при первом показе страницы
+            name = post.image.name
+            transaction.on_commit(lambda: schedule_thumbnails(name))
+        return post
+
 
 class CommentForm(forms.ModelForm):
     text = forms.CharField(widget=forms.Textarea, required=True)
@@ -0,0 +1,188 @@
+"""Картинки постов: проверка и перекодирование при загрузке, варианты
+разной ширины для `srcset`.
+
+Оригинал, который больше нужного, несёт метаданные (EXIF с координатами
+съёмки и т. п.) или сохранён в формате, не годном для браузера,
+пересохраняется в первый доступный формат из `POST_IMAGE_FORMATS`.
+Небольшие чистые картинки сохраняются как есть.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from core.timing import span
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые браузеры показывают без оговорок
+WEB_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Форматы, в которых нет прозрачности
+OPAQUE_FORMATS = {'JPEG'}
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+# Вариант, который отдаётся браузерам без поддержки `srcset`
+DEFAULT_WIDTH = 960
+SIZES = '(min-width: 992px) 960px, 100vw'
+
+
+def _supported(format):
+    Image.init()
+    return format in Image.SAVE
+
+
+def upload_format():
+    """Формат перекодированного оригинала."""
+    for format in settings.POST_IMAGE_FORMATS:
+        if _supported(format):
+            return format
+    return 'JPEG'
+
+
+def variant_formats():
+    """Форматы вариантов для ленты, запасной JPEG — последним.
+
+    Кроме Pillow формат должен знать sorl-thumbnail (AVIF он пока не
+    умеет).
+    """
+    formats = [
+        format for format in settings.POST_IMAGE_FORMATS
+        if format != 'JPEG' and format in EXTENSIONS and _supported(format)
+    ]
+    return formats + ['JPEG']
+
+
+def variant_geometry(width):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    return width, round(width * ratio_height / ratio_width)
+
+
+def variants():
+    """`(ширина, формат, геометрия, опции)` всех вариантов картинки."""
+    for format in variant_formats():
+        for width in settings.POST_IMAGE_WIDTHS:
+            geometry = '{}x{}'.format(*variant_geometry(width))
+            yield width, format, geometry, {
+                'crop': 'center',
+                'upscale': True,
+                'format': format,
+                'quality': settings.POST_IMAGE_QUALITY,
+            }
+
+
+def image_sources(image):
+    """Данные для `<picture>`: по `srcset` на формат и запасной `src`.
+
+    Возвращает `None`, если картинки нет или её не удалось прочитать.
+    """
+    if not image:
+        return None
+    srcsets = {}
+    try:
+        with span('thumb'):
+            for width, format, geometry, options in variants():
+                thumbnail = get_thumbnail(image, geometry, **options)
+                srcsets.setdefault(format, []).append(
+                    (width, thumbnail.url)
+                )
+    except Exception:
+        logger.exception('Не удалось подготовить картинку %s', image)
+        return None
+    fallback = srcsets.pop('JPEG')
+    width, height = variant_geometry(DEFAULT_WIDTH)
+    return {
+        'sources': [
+            {'type': Image.MIME[format], 'srcset': _srcset(urls)}
+            for format, urls in srcsets.items()
+        ],
+        'src': min(fallback, key=lambda item: abs(item[0] - width))[1],
+        'srcset': _srcset(fallback),
+        'sizes': SIZES,
+        'width': width,
+        'height': height,
+    }
+
+
+def _srcset(urls):
+    return ', '.join(f'{url} {width}w' for width, url in urls)
+
+
+def _has_metadata(image):
+    return any(key in image.info for key in METADATA_KEYS) or bool(
+        image.getexif()
+    )
+
+
+def normalize_upload(upload):
+    """Проверяет загруженную картинку и при необходимости перекодирует.
+
+    Возвращает файл для сохранения — `upload` или новый; слишком
+    большой файл или картинка отклоняются с `ValidationError`.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            code='image_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    if getattr(image, 'is_animated', False):
+        # Анимацию покадрово не пересобираем
+        upload.seek(0)
+        return upload
+    if (
+        image.format in WEB_FORMATS
+        and width <= settings.POST_IMAGE_MAX_WIDTH
+        and upload.size <= settings.POST_IMAGE_REENCODE_BYTES
+        and not _has_metadata(image)
+    ):
+        upload.seek(0)
+        return upload
+    return _reencode(upload.name, image)
+
+
+def _reencode(name, image):
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    max_width = settings.POST_IMAGE_MAX_WIDTH
+    if image.width > max_width:
+        image.thumbnail((max_width, image.height), Image.LANCZOS)
+    format = upload_format()
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if has_alpha and format not in OPAQUE_FORMATS:
+        image = image.convert('RGBA')
+    elif has_alpha:
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA'))
+        image = background
+    else:
+        image = image.convert('RGB')
+    params = {'quality': settings.POST_IMAGE_QUALITY}
+    if icc_profile:
+        params['icc_profile'] = icc_profile
+    if format == 'JPEG':
+        params.update(optimize=True, progressive=True)
+    buffer = BytesIO()
+    image.save(buffer, format, **params)
+    root, _ = os.path.splitext(os.path.basename(name))
+    extension = EXTENSIONS.get(format, format.lower())
+    return SimpleUploadedFile(
+        f'{root}.{extension}',
+        buffer.getvalue(),
+        content_type=Image.MIME.get(format),
+    )
@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import BATCH_SIZE, MODELS, export_content
+
+LABELS = {model._meta.label_lower: model for model in MODELS}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в NDJSON '
+        'потоком, без загрузки таблиц в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; «-» — стандартный вывод.'
+        )
+        parser.add_argument(
+            '--models', nargs='+', choices=sorted(LABELS),
+            help='Какие модели выгрузить; по умолчанию все.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def progress(self, label, count):
+        self.stderr.write(f'{label}: {count}')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        models = MODELS
+        if options['models']:
+            models = [
+                model for model in MODELS
+                if model._meta.label_lower in options['models']
+            ]
+        if options['path'] == '-':
+            totals = self.export(sys.stdout, models, options)
+        else:
+            with open(options['path'], 'w', encoding='utf-8') as stream:
+                totals = self.export(stream, models, options)
+        self.stderr.write(self.style.SUCCESS(
+            'Выгружено: ' + ', '.join(
+                f'{label} {count}' for label, count in totals.items()
+            )
+        ))
+
+    def export(self, stream, models, options):
+        return export_content(
+            stream,
+            models,
+            batch_size=options['batch_size'],
+            progress=self.progress
+        )
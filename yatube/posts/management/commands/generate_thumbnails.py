@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from core.background import close_connections
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Сколько картинок обрабатывать параллельно.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Сколько картинок ставить в пул за раз.'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct().iterator()
+        workers = options['workers']
+        # С одним обработчиком картинки создаются в текущем потоке
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        images = thumbnails = 0
+        try:
+            while True:
+                chunk = list(islice(names, options['chunk_size']))
+                if not chunk:
+                    break
+                if pool:
+                    done = pool.map(
+                        close_connections(generate_thumbnails), chunk
+                    )
+                else:
+                    done = map(generate_thumbnails, chunk)
+                thumbnails += sum(done)
+                images += len(chunk)
+                self.stdout.write(f'Обработано картинок: {images}')
+        finally:
+            if pool:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово миниатюр: {thumbnails} для {images} картинок'
+        ))
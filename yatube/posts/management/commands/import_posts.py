@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import BATCH_SIZE, Importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON-выгрузку export_posts пачками INSERT, '
+        'затем пересчитывает счётчики и ленты подписок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки; «-» — стандартный ввод.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Пропускать строки, которые уже есть в базе.'
+        )
+
+    def progress(self, label, count):
+        self.stderr.write(f'{label}: {count}')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным.')
+        importer = Importer(
+            batch_size=options['batch_size'],
+            ignore_conflicts=options['ignore_conflicts'],
+            progress=self.progress
+        )
+        try:
+            if options['path'] == '-':
+                totals = importer.load(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as stream:
+                    totals = importer.load(stream)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stderr.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{label} {count}' for label, count in totals.items()
+            )
+        ))
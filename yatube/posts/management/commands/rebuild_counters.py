@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Comment, Follow, Post, User, UserStats
+from posts.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк счётчиков вставлять за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_user_stats(
+                User, UserStats, Post, Comment, Follow,
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны для {total} пользователей'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import is_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='Слить сегменты индекса после перестройки.'
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError(
+                'Полнотекстовый индекс есть только у SQLite.'
+            )
+        with transaction.atomic():
+            rebuild_search_index(optimize=options['optimize'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен, постов: {Post.objects.count()}'
+        ))
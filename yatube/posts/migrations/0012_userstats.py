@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    # Своя копия подсчёта из posts.stats: правка модуля не должна менять
+    # уже написанную миграцию
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    sources = {
+        'posts_count': (Post.objects, 'author'),
+        'comments_count': (Comment.objects, 'author'),
+        'followers_count': (Follow.objects, 'author'),
+        'following_count': (Follow.objects, 'user'),
+    }
+    stats = {}
+    for field, (manager, owner) in sources.items():
+        rows = manager.order_by().values_list(owner).annotate(
+            total=Count('pk')
+        )
+        for user_id, total in rows.iterator():
+            stats.setdefault(user_id, {})[field] = total
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id, **stats.get(user_id, {}))
+            for user_id in user_ids.iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+FTS_TABLE = 'posts_post_fts'
+# Триггеры поискового индекса из 0014_post_search
+TRIGGERS = {
+    'posts_post_fts_insert': f'''
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    'posts_post_fts_delete': f'''
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    'posts_post_fts_update': f'''
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+}
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite пересоздаёт posts_post при добавлении поля, а вместе со
+    # старой таблицей удаляются и триггеры поискового индекса
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, body in TRIGGERS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_search'),
+    ]
+
+    operations = [
+        # При откате триггеры восстанавливаются после удаления полей
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_search_triggers
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='modified',
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name='Изменена'
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='modified',
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name='Изменён'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            restore_search_triggers, migrations.RunPython.noop
+        ),
+    ]
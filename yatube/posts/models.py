@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -27,14 +28,65 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Входит в ключ закешированной карточки поста (posts.cache)
+    modified = models.DateTimeField(auto_now=True, verbose_name='Изменён')
 
     class Meta:
         ordering = ['-pub_date']
+        # Индексы повторяют порядок ключа курсора ленты: (pub_date, id)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
 
+class FullTextField(models.TextField):
+    """Столбец индекса SQLite FTS5; ищется через `__match`."""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearchEntry(models.Model):
+    """Строка полнотекстового индекса постов (`posts.search`).
+
+    Таблицу и триггеры ведут миграции; Django её только читает, чтобы
+    соединять посты с индексом обычным JOIN.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry'
+    )
+    text = FullTextField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок')
     slug = models.SlugField(
@@ -42,6 +94,7 @@ class Group(models.Model):
         verbose_name='Номер'
     )
     description = models.TextField(verbose_name='Описание')
+    modified = models.DateTimeField(auto_now=True, verbose_name='Изменена')
 
     def __str__(self) -> str:
         return self.title
@@ -64,6 +117,14 @@ class Comment(models.Model):
         verbose_name='Дата создания комментария'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -76,3 +137,85 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: по строке на пост для читателя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому
+    `/follow/` читает только строки самого читателя по индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата')
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для шапок профиля и поста.
+
+    Поддерживаются сигналами при сохранении и удалении `Post`, `Comment`
+    и `Follow`; пересчитываются командой `rebuild_counters`.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя без обращения к базе, если они подгружены
+        через `select_related('stats')`."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """Атомарно сдвигает счётчики: `bump(user_id, posts_count=1)`."""
+        changes = {
+            field: Greatest(models.F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+        if cls.objects.filter(user_id=user_id).update(**changes):
+            return
+        if all(delta > 0 for delta in deltas.values()):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**changes)
@@ -0,0 +1,370 @@
+import base64
+import binascii
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from core.background import BackgroundPool
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Параметры запроса, которые выбирают страницу ленты
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(date, pk):
+    """Упаковывает пару (дата, id) в непрозрачный токен для URL."""
+    raw = f'{date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора обратно в пару (дата, id)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        date, pk = raw.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    if date is None:
+        raise InvalidCursor(token)
+    return date, pk
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации.
+
+    Совместима с шаблонами, которые ждут `Page`: поддерживает итерацию,
+    `len`, `has_next`/`has_previous`, а вместо номеров страниц отдаёт
+    токены `next_cursor`/`previous_cursor`.
+    """
+    is_cursor = True
+
+    def __init__(self, rows, paginator, position, has_next, has_previous):
+        super().__init__(paginator.get_items(rows), None, paginator)
+        self.rows = rows
+        self.position = position
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage %s>' % self.position
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def _cursor(self, row):
+        return encode_cursor(*self.paginator.cursor_values(row))
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.rows:
+            return self._cursor(self.rows[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.rows:
+            return self._cursor(self.rows[0])
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (`keys`) вместо LIMIT/OFFSET.
+
+    Каждая страница — это один запрос `WHERE (date, id) < курсор
+    ORDER BY date, id LIMIT per_page + 1`, поэтому её стоимость не зависит
+    от глубины, а `COUNT(*)` не выполняется вовсе.
+
+    `item` превращает строку выборки в элемент страницы — например,
+    запись ленты подписок в сам пост.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk'),
+                 descending=True, item=None):
+        self.keys = keys
+        self.descending = descending
+        self.item = item
+        prefix = '-' if descending else ''
+        object_list = object_list.order_by(*(prefix + key for key in keys))
+        super().__init__(object_list, per_page)
+
+    def cursor_values(self, row):
+        return tuple(getattr(row, key) for key in self.keys)
+
+    def get_items(self, rows):
+        if self.item is None:
+            return rows
+        return [self.item(row) for row in rows]
+
+    def _beyond(self, cursor, forward):
+        """Условие «строка лежит после курсора» в направлении обхода.
+
+        Нестрогая граница по дате вынесена отдельно, чтобы база могла
+        начать просмотр индекса (date, id) сразу с курсора.
+        """
+        lookup = 'lt' if forward == self.descending else 'gt'
+        date_key, pk_key = self.keys
+        date, pk = cursor
+        return Q(**{f'{date_key}__{lookup}e': date}) & (
+            Q(**{f'{date_key}__{lookup}': date})
+            | Q(**{f'{pk_key}__{lookup}': pk})
+        )
+
+    def cursor_page(self, after=None, before=None):
+        """Страница после `after` или перед `before`.
+
+        Битый или пустой токен даёт первую страницу, как `get_page`
+        для неверного номера.
+        """
+        try:
+            if before:
+                return self._page_before(before, decode_cursor(before))
+            if after:
+                return self._page_after(after, decode_cursor(after))
+        except InvalidCursor:
+            pass
+        return self._page_after(None, None)
+
+    def _page_after(self, token, cursor):
+        queryset = self.object_list
+        if cursor is not None:
+            queryset = queryset.filter(self._beyond(cursor, forward=True))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page],
+            self,
+            position=f'after={token}' if token else 'first',
+            has_next=has_next,
+            has_previous=cursor is not None,
+        )
+
+    def _page_before(self, token, cursor):
+        queryset = self.object_list.filter(
+            self._beyond(cursor, forward=False)
+        ).reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page][::-1],
+            self,
+            position=f'before={token}',
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+
+_count_pool = BackgroundPool('FEED_COUNT_WORKERS', 'feed-counts')
+
+
+def count_feed(count_key, queryset):
+    """Считает ленту и кладёт число в кеш вместе со временем подсчёта."""
+    count = queryset.count()
+    cache.set(count_key, (count, time()), None)
+    return count
+
+
+def schedule_count(count_key, queryset):
+    """Ставит пересчёт ленты в фоновый пул.
+
+    При `FEED_COUNT_WORKERS = 0` лента пересчитывается сразу.
+    """
+    return _count_pool.submit(count_feed, count_key, queryset)
+
+
+class WindowedPage(Page):
+    """Страница с оценочным числом страниц.
+
+    Есть ли следующая страница, известно точно — по лишней строке
+    выборки; `page_window` — ограниченный набор номеров для виджета.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    @cached_property
+    def page_window(self):
+        return self.paginator.get_elided_page_range(self.number)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает ленту на каждый запрос.
+
+    Число объектов берётся из кеша по `count_key`; если подсчёт старше
+    `FEED_COUNT_TTL` секунд, он обновляется в фоне, а запрос получает
+    прежнее значение. Число страниц поэтому оценочное: страницы за его
+    пределами всё равно открываются, пока в ленте есть посты, но не
+    дальше `page_slack` страниц — иначе номер вида `?page=2**63` ушёл бы
+    в OFFSET как есть.
+    """
+    ELLIPSIS = '…'
+    page_slack = 100
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        cached = cache.get(self.count_key)
+        if cached is None:
+            return count_feed(self.count_key, self.object_list)
+        count, counted_at = cached
+        # add() пропускает только один пересчёт на ленту за раз
+        if (time() - counted_at > settings.FEED_COUNT_TTL and cache.add(
+                f'{self.count_key}:refresh', True,
+                settings.FEED_COUNT_TTL)):
+            schedule_count(self.count_key, self.object_list)
+        return count
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        if number > self.num_pages + self.page_slack:
+            raise EmptyPage(_('That page contains no results'))
+        return number
+
+    def recount(self):
+        """Точное число объектов, когда оценка разошлась с базой."""
+        if self.count_key is not None:
+            return count_feed(self.count_key, self.object_list)
+        return super().count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return WindowedPage(
+            rows[:self.per_page], number, self, len(rows) > self.per_page
+        )
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Оценка разошлась с базой: пересчитываем и отдаём последнюю
+            self.count = self.recount()
+            self.__dict__.pop('num_pages', None)
+            return self.page(self.num_pages)
+
+    def get_elided_page_range(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг `number` и по краям, пропуски заменены
+        на `ELLIPSIS`: ссылок не больше `2 * (on_each_side + on_ends) + 3`
+        при любой длине ленты."""
+        last = max(self.num_pages, number)
+        if last <= (on_each_side + on_ends) * 2 + 1:
+            return list(range(1, last + 1))
+        pages = []
+        if number > on_each_side + on_ends + 2:
+            pages.extend(range(1, on_ends + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(range(number - on_each_side, number + 1))
+        else:
+            pages.extend(range(1, number + 1))
+        if number < last - on_each_side - on_ends - 1:
+            pages.extend(range(number + 1, number + on_each_side + 1))
+            pages.append(self.ELLIPSIS)
+            pages.extend(range(last - on_ends + 1, last + 1))
+        else:
+            pages.extend(range(number + 1, last + 1))
+        return pages
+
+
+class CappedCountPaginator(EstimatedCountPaginator):
+    """Пагинатор для списков с произвольными фильтрами, как в админке.
+
+    Считает не дальше `count_limit` строк: `COUNT(*)` по подзапросу
+    с `LIMIT` стоит одинаково на любой таблице. Страницы за пределом
+    открываются на `page_slack` страниц вперёд, дальше — последняя
+    страница по тому же ограниченному подсчёту.
+    """
+    count_limit = 10000
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True):
+        super().__init__(
+            object_list,
+            per_page,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page
+        )
+
+    @cached_property
+    def count(self):
+        # Для подсчёта не нужны ни порядок, ни вычисляемые поля
+        return self.object_list.order_by().values('pk')[
+            :self.count_limit
+        ].count()
+
+    def recount(self):
+        return self.count
+
+
+def paginate(request, queryset, per_page=POSTS_PER_PAGE, item=None,
+             count_key=None, **kwargs):
+    """Страница ленты для запроса.
+
+    По умолчанию лента листается курсором (`?after=`/`?before=`);
+    явный `?page=N` обслуживается `EstimatedCountPaginator` с числом
+    объектов из кеша по `count_key`.
+    """
+    if 'page' in request.GET:
+        paginator = EstimatedCountPaginator(
+            queryset, per_page, count_key=count_key
+        )
+        page_obj = paginator.get_page(request.GET.get('page'))
+        if item is not None:
+            page_obj.object_list = [item(row) for row in page_obj]
+        return page_obj
+    paginator = CursorPaginator(queryset, per_page, item=item, **kwargs)
+    return paginator.cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+
+
+def paginate_comments(request, post, per_page=COMMENTS_PER_PAGE):
+    """Курсорная страница комментариев поста с подгруженными авторами.
+
+    `?order=newest` листает от новых к старым, по умолчанию — от старых.
+    """
+    order = 'newest' if request.GET.get('order') == 'newest' else 'oldest'
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        per_page,
+        keys=('created', 'pk'),
+        descending=order == 'newest',
+    )
+    page_obj = paginator.cursor_page(after=request.GET.get('after'))
+    page_obj.order = order
+    return page_obj
@@ -0,0 +1,143 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite текст постов индексируется виртуальной таблицей FTS5 с внешним
+содержимым: сам текст хранится только в `posts_post`, а триггеры на
+вставку, правку и удаление держат индекс в согласии с таблицей — в том
+числе при `bulk_create`, `update()` и удалении queryset'ом.
+
+Миграция, которая пересоздаёт таблицу `posts_post` (в SQLite так
+делается почти любое изменение её схемы), удаляет и триггеры; после
+таких операций миграция должна создать их заново — своей копией SQL,
+как `0015_modified`, а не импортом этого модуля.
+
+На других базах поиск сводится к `icontains` без ранжирования.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+TRIGGERS = {
+    'posts_post_fts_insert': f'''
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    'posts_post_fts_delete': f'''
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    'posts_post_fts_update': f'''
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+}
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_search_triggers(using=connection):
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+def create_search_index(using=connection):
+    """Создаёт индекс с триггерами и заполняет его текущими постами."""
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"text, content='posts_post', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+    create_search_triggers(using)
+    rebuild_search_index(using)
+
+
+def drop_search_index(using=connection):
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def rebuild_search_index(using=connection, optimize=False):
+    """Перестраивает индекс по содержимому `posts_post`."""
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+        if optimize:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+            )
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательского ввода: все слова обязательны,
+    каждое ищется как префикс. Спецсимволы синтаксиса FTS5 отбрасываются,
+    поэтому ввод не может сломать запрос."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+class InSubquery(RawSQL):
+    """Сырой подзапрос для правой части `__in`.
+
+    `In` сам берёт подзапрос в скобки; `RawSQL` добавил бы вторые, и
+    SQLite прочёл бы `IN ((SELECT ...))` как список из одного значения.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching_post_ids(query):
+    """Подзапрос с id постов, подходящих под запрос, для `pk__in`."""
+    return InSubquery(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [match_expression(query)]
+    )
+
+
+def filter_posts(queryset, query):
+    """Сужает queryset постов до найденных, не меняя порядок."""
+    if not match_expression(query):
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(text__icontains=query)
+    return queryset.filter(pk__in=matching_post_ids(query))
+
+
+def search_posts(query, queryset=None):
+    """Посты по запросу, самые релевантные первыми (BM25)."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not is_supported():
+        return queryset.filter(text__icontains=query).order_by(
+            '-pub_date', '-pk'
+        )
+    # Посты соединяются с индексом (`PostSearchEntry`): FTS5 отдаёт
+    # совпадения вместе с рангом, посты берутся по первичному ключу
+    return queryset.filter(search_entry__text__match=expression).annotate(
+        rank=RawSQL(f'bm25({FTS_TABLE})', [])
+    ).order_by('rank', '-pub_date')
@@ -0,0 +1,174 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.page_cache import purge_surrogate_keys
+from .cache import (ALL_FEEDS, MAIN_FEED, MAIN_PAGE, POST_CARDS, author_key,
+                    bump_feeds, follow_feed, group_feed, group_key, post_key,
+                    profile_feed)
+from .follow_graph import forget_following
+from .models import Comment, Follow, Group, Post, Timeline, User, UserStats
+
+
+def _bump_post_feeds(post, *group_ids):
+    # Ленты подписок собраны из версий профилей авторов
+    # (follow_feed_versions), по ключу на подписчика не пишем
+    bump_feeds(
+        MAIN_FEED,
+        profile_feed(post.author_id),
+        *(group_feed(group_id) for group_id in set(group_ids) if group_id)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста, чтобы сбросить и её ленту."""
+    instance._saved_group_id = None
+    if instance.pk:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков автора и сбрасывает
+    кеш всех лент, где виден пост."""
+    if created:
+        followers = Follow.objects.filter(
+            author_id=instance.author_id
+        ).values_list('user_id', flat=True)
+        Timeline.objects.bulk_create(
+            (
+                Timeline(
+                    user_id=user_id,
+                    post_id=instance.pk,
+                    pub_date=instance.pub_date
+                )
+                for user_id in followers.iterator()
+            ),
+            batch_size=500,
+            ignore_conflicts=True
+        )
+    _bump_post_feeds(
+        instance,
+        instance.group_id,
+        getattr(instance, '_saved_group_id', None)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def forget_post(sender, instance, **kwargs):
+    _bump_post_feeds(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_group(sender, instance, **kwargs):
+    """Группа видна в карточках постов любой ленты."""
+    bump_feeds(ALL_FEEDS)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if not created:
+        return
+    bump_feeds(follow_feed(instance.user_id))
+    posts = Post.objects.filter(
+        author_id=instance.author_id
+    ).values_list('pk', 'pub_date')
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=instance.user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.iterator()
+        ),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Убирает из ленты бывшего подписчика посты автора."""
+    bump_feeds(follow_feed(instance.user_id))
+    Timeline.objects.filter(
+        user_id=instance.user_id,
+        post__author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_saved_group_id', None)}
+    purge_surrogate_keys(
+        MAIN_PAGE,
+        post_key(instance.pk),
+        author_key(instance.author_id),
+        *(group_key(group_id) for group_id in group_ids if group_id)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    purge_surrogate_keys(post_key(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, **kwargs):
+    purge_surrogate_keys(group_key(instance.pk), POST_CARDS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_pages(sender, instance, **kwargs):
+    purge_surrogate_keys(author_key(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_follow_graph(sender, instance, **kwargs):
+    forget_following(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.user_id, following_count=1)
+        UserStats.bump(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    UserStats.bump(instance.user_id, following_count=-1)
+    UserStats.bump(instance.author_id, followers_count=-1)
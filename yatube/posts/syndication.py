@@ -0,0 +1,116 @@
+"""RSS, Atom и JSON Feed для лент главной, группы и профиля.
+
+Данные ленты — последние посты в виде простых словарей — кешируются под
+версией ленты (`posts.cache`), поэтому опрос без изменений не ходит в
+базу за постами. Вместе с данными хранится `ETag` — хеш содержимого;
+`Last-Modified` — время версии ленты (`core.versions`), которое
+сдвигается и при правке или удалении постов.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.utils import feedgenerator
+from django.utils.text import Truncator
+
+from core.versions import versions_modified
+from .cache import feed_version, feed_versions
+
+FEED_ITEMS = 20
+DATA_KEY = 'syndication:{}:{}'
+
+
+class JsonFeed(feedgenerator.SyndicationFeed):
+    """JSON Feed 1.1 (https://jsonfeed.org/version/1.1)."""
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def write(self, outfile, encoding):
+        feed = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': self.feed['description'],
+            'language': self.feed['language'],
+            'items': [
+                {
+                    'id': item['unique_id'],
+                    'url': item['link'],
+                    'title': item['title'],
+                    'content_text': item['description'],
+                    'date_published': item['pubdate'].isoformat(),
+                    'authors': [{'name': item['author_name']}],
+                    'tags': list(item['categories']),
+                }
+                for item in self.items
+            ],
+        }
+        json.dump(feed, outfile, ensure_ascii=False)
+
+
+GENERATORS = {
+    'rss': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+    'json': JsonFeed,
+}
+
+
+def feed_data(feed, queryset):
+    """Последние посты ленты и валидаторы из кеша версии ленты.
+
+    `queryset` должен подгружать автора и группу; выполняется только
+    при промахе кеша.
+    """
+    versions = feed_versions(feed)
+    key = DATA_KEY.format(feed, feed_version(feed, versions))
+    data = cache.get(key)
+    if data is None:
+        items = [
+            {
+                'pk': post.pk,
+                'text': post.text,
+                'pub_date': post.pub_date,
+                'author': post.author.username,
+                'group': post.group.title if post.group else None,
+            }
+            for post in queryset.order_by('-pub_date', '-pk')[:FEED_ITEMS]
+        ]
+        digest = hashlib.md5(
+            json.dumps(items, default=str, sort_keys=True).encode()
+        ).hexdigest()
+        data = {'items': items, 'etag': digest}
+        cache.set(key, data, None)
+    return {**data, 'last_modified': versions_modified(versions)}
+
+
+def feed_etag(data, feed_format, title):
+    """ETag тела ленты: содержимое, формат и заголовок (в нём имя группы
+    или автора, которое меняется без новых постов)."""
+    return hashlib.md5(
+        f'{data["etag"]}:{feed_format}:{title}'.encode()
+    ).hexdigest()
+
+
+def render_feed(data, feed_format, title, link, feed_url, description,
+                item_link):
+    """Собирает тело ленты в формате `feed_format`; `item_link(pk)` —
+    адрес поста."""
+    generator = GENERATORS[feed_format](
+        title=title,
+        link=link,
+        feed_url=feed_url,
+        description=description,
+        language='ru',
+    )
+    for item in data['items']:
+        url = item_link(item['pk'])
+        generator.add_item(
+            title=Truncator(item['text']).chars(60),
+            link=url,
+            unique_id=url,
+            description=item['text'],
+            pubdate=item['pub_date'],
+            author_name=item['author'],
+            categories=[item['group']] if item['group'] else (),
+        )
+    return generator.writeString('utf-8'), generator.content_type
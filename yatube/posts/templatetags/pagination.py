@@ -0,0 +1,20 @@
+from django import template
+
+from ..paginator import PAGE_PARAMS
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, **params):
+    """Ссылка на другую страницу той же выборки: строка запроса текущей
+    страницы (например, `q` поиска) с новыми параметрами страницы.
+
+        {% page_url after=page_obj.next_cursor %}
+    """
+    query = context['request'].GET.copy()
+    for key in PAGE_PARAMS:
+        query.pop(key, None)
+    for key, value in params.items():
+        query[key] = value
+    return f'?{query.urlencode()}' if query else context['request'].path
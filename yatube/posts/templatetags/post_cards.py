@@ -0,0 +1,14 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов ленты из кеша; отрисовываются только промахи.
+
+        {% post_cards page_obj as cards %}
+    """
+    return render_cards(posts)
@@ -0,0 +1,11 @@
+from django import template
+
+from ..images import image_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post):
+    """Картинка поста в `<picture>` с вариантами под ширину экрана."""
+    return {'image': image_sources(post.image)}
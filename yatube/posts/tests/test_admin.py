@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.bulk import HANDLED_RELATIONS, post_relations
+from posts.models import Comment, Follow, Group, Post, Timeline, UserStats
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    """Проверка списка постов в админке"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.old = Group.objects.create(title='Старая', slug='old')
+        cls.new = Group.objects.create(title='Новая', slug='new')
+        for number in range(30):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.old
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        cls.url = reverse('admin:posts_post_changelist')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Список постов не делает запросов на каждую строку"""
+        with self.assertNumQueries(6):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 30)
+        self.assertNotContains(response, '<option value="%s">' % self.new.pk)
+
+    def test_reassign_group_action(self):
+        """Действие переносит выбранные посты в группу"""
+        posts = Post.objects.order_by('pk')[:5]
+        self.client.post(self.url, {
+            'action': 'reassign_group',
+            'group': self.new.pk,
+            '_selected_action': [post.pk for post in posts],
+        })
+        self.assertEqual(self.new.posts.count(), 5)
+        self.assertEqual(self.old.posts.count(), 25)
+
+    def test_delete_action_asks_first(self):
+        """Удаление сначала показывает подтверждение и ничего не удаляет"""
+        response = self.client.post(self.url, {
+            'action': 'delete_posts',
+            'select_across': 1,
+            'index': 0,
+            '_selected_action': [Post.objects.first().pk],
+        })
+        self.assertTemplateUsed(
+            response, 'admin/posts/post/delete_posts_confirmation.html'
+        )
+        self.assertContains(response, 'Удалить выбранные посты: 30?')
+        self.assertContains(response, 'name="select_across" value="1"')
+        self.assertEqual(Post.objects.count(), 30)
+
+    def test_delete_action_cleans_up(self):
+        """Удаление пачками убирает комментарии, ленты и правит счётчики"""
+        self.client.post(self.url, {
+            'action': 'delete_posts',
+            'select_across': 1,
+            'index': 0,
+            '_selected_action': [Post.objects.first().pk],
+            'post': 'yes',
+        })
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Timeline.objects.exists())
+        self.assertEqual(UserStats.for_user(self.author).posts_count, 0)
+        self.assertEqual(UserStats.for_user(self.reader).comments_count, 0)
+
+    def test_delete_action_knows_every_relation(self):
+        """Быстрое удаление знает все связи постов; новую связь нужно
+        добавить в `HANDLED_RELATIONS` вместе с её очисткой"""
+        self.assertEqual(post_relations(), HANDLED_RELATIONS)
+
+    def test_delete_action_falls_back_to_collector(self):
+        """С незнакомой связью посты удаляются обычным delete()"""
+        with mock.patch('posts.bulk.HANDLED_RELATIONS', set()):
+            self.client.post(self.url, {
+                'action': 'delete_posts',
+                'select_across': 1,
+                'index': 0,
+                '_selected_action': [Post.objects.first().pk],
+                'post': 'yes',
+            })
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Timeline.objects.exists())
+        self.assertEqual(UserStats.for_user(self.author).posts_count, 0)
+        self.assertEqual(UserStats.for_user(self.reader).comments_count, 0)
@@ -1,11 +1,21 @@
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.conf import settings
-from django.test import Client, TestCase, override_settings
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
+from ..images import upload_format, variants
 from ..models import Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -96,3 +106,172 @@ class PostCreateFormTests(TestCase):
             form_data['text'],
             'Не удалось отредактироват пост'
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    """Проверка фоновой подготовки миниатюр"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_thumbnails_command(self):
+        """Команда создаёт миниатюры для уже загруженных картинок"""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        Post.objects.create(
+            author=User.objects.create_user(username='auth'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=small_gif,
+                content_type='image/gif'
+            ),
+        )
+        Post.objects.create(
+            author=User.objects.get(username='auth'),
+            text='Пост без картинки',
+        )
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn(
+            f'Готово миниатюр: {len(list(variants()))} для 1 картинок',
+            out.getvalue()
+        )
+
+    def test_feed_image_srcset(self):
+        """В ленте картинка отдаётся вариантами разной ширины"""
+        Post.objects.create(
+            author=User.objects.create_user(username='auth'),
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('feed.png', _png(100, 50)),
+        )
+        cache.clear()
+        response = Client().get(reverse('posts:main'))
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'loading="lazy"')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailScheduleTests(TransactionTestCase):
+    """Миниатюры ставятся в очередь только после фиксации транзакции"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.client.force_login(self.user)
+        patcher = mock.patch('posts.forms.schedule_thumbnails')
+        self.schedule = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_post_create_queues_thumbnails(self):
+        """Новый пост с картинкой ставит её миниатюры в очередь"""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('queued.png', _png(100, 50)),
+        })
+        post = Post.objects.get()
+        self.schedule.assert_called_once_with(post.image.name)
+
+    def test_queued_after_commit(self):
+        """Внутри транзакции миниатюры ждут её фиксации, при откате —
+        не ставятся вовсе"""
+        for rollback in (True, False):
+            with self.subTest(rollback=rollback):
+                self.schedule.reset_mock()
+                try:
+                    with transaction.atomic():
+                        form = PostForm(
+                            {'text': 'Пост'},
+                            {'image': SimpleUploadedFile(
+                                'atomic.png', _png(100, 50)
+                            )},
+                            instance=Post(author=self.user),
+                        )
+                        self.assertTrue(form.is_valid())
+                        post = form.save()
+                        self.schedule.assert_not_called()
+                        if rollback:
+                            raise RuntimeError
+                except RuntimeError:
+                    pass
+                if rollback:
+                    self.schedule.assert_not_called()
+                else:
+                    self.schedule.assert_called_once_with(post.image.name)
+
+    def test_post_without_image(self):
+        """Пост без картинки ничего не ставит в очередь"""
+        self.client.post(reverse('posts:post_create'), {'text': 'Без'})
+        self.schedule.assert_not_called()
+
+
+def _png(width, height, **params):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG', **params)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    """Проверка и перекодирование картинок при загрузке"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='auth'))
+
+    def create(self, name, content):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def test_large_photo_reencoded(self):
+        """Широкое фото с EXIF уменьшается и сохраняется без метаданных"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (3000, 1000), 'blue').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        self.create('photo.jpg', buffer.getvalue())
+        post = Post.objects.get()
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, upload_format())
+            self.assertEqual(image.width, settings.POST_IMAGE_MAX_WIDTH)
+            self.assertFalse(image.getexif())
+        self.assertTrue(post.image.name.startswith('posts/photo.'))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        """Слишком большая картинка не принимается"""
+        response = self.create('big.png', _png(100, 100))
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.'
+        )
+
+    def test_clean_image_kept(self):
+        """Небольшая картинка без метаданных сохраняется как есть"""
+        content = _png(100, 50)
+        self.create('clean.png', content)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/clean.png')
+        self.assertEqual(post.image.read(), content)
@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -32,3 +35,36 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         post_cut = post.text[:15]
         self.assertEqual(post_cut, str(post))
+
+
+class UserStatsTest(TestCase):
+    """Проверка денормализованных счётчиков пользователя"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении объектов"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.delete()
+        follow.delete()
+        Follow.objects.create(user=self.reader, author=self.author)
+        author = UserStats.objects.get(user=self.author)
+        reader = UserStats.objects.get(user=self.reader)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(reader.following_count, 1)
+        self.assertEqual(reader.comments_count, 0)
+
+    def test_rebuild_command_fixes_drift(self):
+        """Команда rebuild_counters пересчитывает счётчики с нуля"""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
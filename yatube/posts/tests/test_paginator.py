@@ -0,0 +1,139 @@
+from time import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginator import (CursorPaginator, EstimatedCountPaginator,
+                             decode_cursor, encode_cursor)
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    """Проверка курсорной пагинации лент"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='StasBasov')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def test_cursor_roundtrip(self):
+        """Токен курсора раскодируется в исходную пару"""
+        post = self.posts[0]
+        self.assertEqual(
+            decode_cursor(encode_cursor(post.pub_date, post.pk)),
+            (post.pub_date, post.pk)
+        )
+
+    def test_walk_forward_and_back(self):
+        """Проход вперёд и назад по курсорам отдаёт все посты по порядку"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.cursor_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.cursor_page(after=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.posts)
+        self.assertEqual(len(page), 5)
+        previous = paginator.cursor_page(before=page.previous_cursor)
+        self.assertEqual(list(previous), self.posts[10:20])
+        self.assertTrue(previous.has_previous())
+
+    def test_page_fetch_is_single_query(self):
+        """Глубокая страница — один запрос без COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        token = encode_cursor(self.posts[19].pub_date, self.posts[19].pk)
+        with self.assertNumQueries(1):
+            page = paginator.cursor_page(after=token)
+        self.assertEqual(list(page), self.posts[20:])
+        self.assertFalse(page.has_next())
+
+    def test_view_follows_cursor(self):
+        """Главная страница листается по ?after= и не падает на мусоре"""
+        response = self.client.get(reverse('posts:main'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        response = self.client.get(
+            reverse('posts:main') + f'?after={page.next_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), self.posts[10:20]
+        )
+        response = self.client.get(reverse('posts:main') + '?after=%%%')
+        self.assertEqual(list(response.context['page_obj']), self.posts[:10])
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    """Проверка номерной пагинации с оценочным числом постов"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='StasBasov')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        cls.posts = Post.objects.order_by('-pub_date', '-pk')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_served_from_cache(self):
+        """Число постов считается один раз, дальше берётся из кеша"""
+        EstimatedCountPaginator(self.posts, 10, count_key='count').count
+        with self.assertNumQueries(0):
+            count = EstimatedCountPaginator(
+                self.posts, 10, count_key='count'
+            ).count
+        self.assertEqual(count, 25)
+
+    def test_pages_beyond_stale_estimate(self):
+        """Устаревшая оценка не мешает открыть существующую страницу"""
+        cache.set('count', (5, time()), None)
+        paginator = EstimatedCountPaginator(self.posts, 10, count_key='count')
+        page = paginator.get_page(3)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+        self.assertTrue(paginator.get_page(2).has_next())
+
+    def test_overestimate_falls_back_to_last_page(self):
+        """Пустая страница по завышенной оценке ведёт на последнюю"""
+        cache.set('count', (100, time()), None)
+        paginator = EstimatedCountPaginator(self.posts, 10, count_key='count')
+        page = paginator.get_page(7)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(paginator.count, 25)
+
+    def test_huge_page_number(self):
+        """Номер далеко за оценкой не уходит в OFFSET, а ведёт на
+        последнюю страницу"""
+        paginator = EstimatedCountPaginator(self.posts, 10, count_key='count')
+        self.assertEqual(paginator.get_page(10 ** 30).number, 3)
+        for url in (reverse('posts:main'), reverse('posts:search')):
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, {'q': 'Пост', 'page': 2 ** 63 - 1}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page_obj'].number, 3)
+
+    def test_page_window_is_bounded(self):
+        """Виджет показывает постоянное число ссылок"""
+        paginator = EstimatedCountPaginator(range(100000), 10)
+        ellipsis = paginator.ELLIPSIS
+        self.assertEqual(
+            paginator.get_elided_page_range(5000),
+            [1, ellipsis, 4998, 4999, 5000, 5001, 5002, ellipsis, 10000]
+        )
+        self.assertEqual(
+            paginator.get_elided_page_range(2),
+            [1, 2, 3, 4, ellipsis, 10000]
+        )
+        self.assertEqual(
+            EstimatedCountPaginator(range(50), 10).get_elided_page_range(1),
+            [1, 2, 3, 4, 5]
+        )
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetExceeded, query_budget
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Бюджеты не зависят от числа постов и комментариев на странице:
+# сессия и пользователь + фиксированное число запросов самой вью.
+VIEW_QUERY_BUDGETS = {
+    'index': 3,
+    'group': 4,
+    'profile': 5,
+    'post_detail': 4,
+    'follow': 3,
+}
+
+
+class QueryBudgetTest(TestCase):
+    """Проверка числа SQL-запросов на страницах лент"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок группы',
+            slug='Something'
+        )
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(5)
+        ]
+        for number in range(15):
+            author = authors[number % len(authors)]
+            Post.objects.create(author=author, text='Текст', group=cls.group)
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = Post.objects.create(
+            author=cls.reader, text='Пост с комментариями', group=cls.group
+        )
+        for author in authors:
+            Comment.objects.create(post=cls.post, author=author, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feed_views_fit_query_budget(self):
+        """Ленты и пост укладываются в фиксированный бюджет запросов"""
+        urls = {
+            'index': reverse('posts:main'),
+            'group': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ),
+            'profile': reverse(
+                'posts:profile', kwargs={'username': 'author0'}
+            ),
+            'post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ),
+            'follow': reverse('posts:follow_index'),
+        }
+        for name, url in urls.items():
+            with self.subTest(view=name):
+                with query_budget(VIEW_QUERY_BUDGETS[name]):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_budget_overrun_fails(self):
+        """Превышение бюджета приводит к падению проверки"""
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                list(User.objects.all())
+                list(Post.objects.all())
@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import FTS_TABLE, match_expression, search_posts
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Проверка полнотекстового поиска по постам"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='StasBasov')
+        cls.coffee = Post.objects.create(
+            author=cls.user, text='Утренний кофе и свежая выпечка'
+        )
+        cls.both = Post.objects.create(
+            author=cls.user, text='Кофе, кофе и ещё раз кофе в городе'
+        )
+        cls.other = Post.objects.create(author=cls.user, text='Про погоду')
+
+    def test_ranked_prefix_search(self):
+        """Поиск без учёта регистра, по префиксу и с ранжированием"""
+        self.assertEqual(
+            list(search_posts('КОФЕ')), [self.both, self.coffee]
+        )
+        self.assertEqual(list(search_posts('выпеч')), [self.coffee])
+        self.assertEqual(list(search_posts('кофе город')), [self.both])
+
+    def test_index_follows_writes(self):
+        """Индекс следует за созданием, правкой и удалением постов"""
+        post = Post.objects.get(pk=self.coffee.pk)
+        post.text = 'Вечерний чай'
+        post.save()
+        self.assertEqual(list(search_posts('выпечка')), [])
+        self.assertEqual(list(search_posts('чай')), [post])
+        Post.objects.filter(pk=self.other.pk).update(text='Снова чай')
+        self.assertEqual(len(search_posts('чай')), 2)
+        post.delete()
+        self.assertEqual(list(search_posts('чай')), [self.other])
+        Post.objects.bulk_create([Post(author=self.user, text='Зелёный чай')])
+        self.assertEqual(len(search_posts('зелёный')), 1)
+
+    def test_query_syntax_is_neutralised(self):
+        """Спецсимволы FTS5 во вводе не ломают запрос"""
+        self.assertEqual(match_expression('"кофе" OR -*'), '"кофе"* "OR"*')
+        self.assertEqual(list(search_posts('*)(')), [])
+        self.assertEqual(len(search_posts('кофе AND')), 0)
+
+    def test_search_view(self):
+        """Страница поиска показывает найденное и сохраняет запрос"""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Кофе номер {i}') for i in range(12)
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'кофе'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%84%D0%B5&amp;page=2')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кофе', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 4)
+        response = self.client.get(reverse('posts:search'))
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_admin_search(self):
+        """Поиск в админке идёт по индексу"""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'выпечка'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.coffee]
+        )
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кофе'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.coffee, self.both}
+        )
+
+    def test_reindex_command(self):
+        """Команда восстанавливает потерянный индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"
+            )
+        self.assertEqual(len(search_posts('кофе')), 0)
+        out = StringIO()
+        call_command('reindex_posts', stdout=out)
+        self.assertIn('постов: 3', out.getvalue())
+        self.assertEqual(len(search_posts('кофе')), 2)
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, Timeline, UserStats
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    """Проверка выгрузки и загрузки контента в NDJSON"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(7):
+            post = Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.path = os.path.join(directory, 'dump.ndjson')
+        self.addCleanup(os.remove, self.path)
+
+    def export(self, *args):
+        err = StringIO()
+        call_command('export_posts', self.path, *args, stderr=err)
+        return err.getvalue()
+
+    def test_export_is_ndjson(self):
+        """Выгрузка — строка JSON на объект, связанные модели раньше"""
+        progress = self.export('--batch-size', '3')
+        with open(self.path, encoding='utf-8') as stream:
+            records = [json.loads(line) for line in stream]
+        self.assertEqual(
+            [record['model'] for record in records],
+            ['posts.group'] + ['posts.post'] * 7 + ['posts.comment'] * 7
+            + ['posts.follow']
+        )
+        post = Post.objects.order_by('pk').first()
+        self.assertEqual(records[1]['pk'], post.pk)
+        self.assertEqual(records[1]['fields']['author_id'], self.author.pk)
+        self.assertIn('posts.post: 3', progress)
+        self.assertIn('posts.post: 6', progress)
+
+    def test_roundtrip_restores_content_and_derived_data(self):
+        """Загрузка восстанавливает объекты, даты, счётчики и ленты"""
+        dates = list(Post.objects.order_by('pk').values_list('pub_date'))
+        self.export()
+        Group.objects.all().delete()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command(
+            'import_posts', self.path, '--batch-size', '2', stderr=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 7)
+        self.assertEqual(Comment.objects.count(), 7)
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pub_date')), dates
+        )
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(), 7)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 7)
+        self.assertEqual(stats.followers_count, 1)
+        # Последовательность id продолжается после загруженных строк
+        Post.objects.create(author=self.author, text='После загрузки')
+        self.assertEqual(Post.objects.count(), 8)
+
+    def test_ignore_conflicts(self):
+        """Повторная загрузка поверх данных пропускает дубликаты"""
+        self.export()
+        Post.objects.order_by('pk').last().delete()
+        err = StringIO()
+        call_command(
+            'import_posts', self.path, '--ignore-conflicts', stderr=err
+        )
+        self.assertEqual(Post.objects.count(), 7)
+        # В итог попадают только действительно вставленные строки
+        self.assertIn('posts.post 1, posts.comment 1', err.getvalue())
@@ -1,15 +1,24 @@
 import shutil
 import tempfile
+from array import array
+from datetime import datetime
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
+from django.utils.timezone import utc
 from django import forms
 
-from posts.models import Comment, Group, Follow, Post
+from core.versions import versions_modified
+from posts.cache import MAIN_FEED, VERSION_KEY, feed_versions, follow_feed
+from posts.follow_graph import following_key, is_following
+from posts.models import Comment, Group, Follow, Post, Timeline
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -165,6 +174,22 @@ class PaginatorViewsTest(TestCase):
         ) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_page_links_keep_query(self):
+        """Ссылки на страницы сохраняют остальные параметры запроса"""
+        response = self.client.get(reverse('posts:main') + '?tag=x')
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'href="?tag=x&amp;after={next_cursor}"')
+        response = self.client.get(
+            reverse('posts:main') + f'?tag=x&after={next_cursor}'
+        )
+        previous_cursor = response.context['page_obj'].previous_cursor
+        self.assertContains(
+            response, f'href="?tag=x&amp;before={previous_cursor}"'
+        )
+        self.assertContains(response, 'href="?tag=x"')
+        response = self.client.get(reverse('posts:main') + '?tag=x&page=1')
+        self.assertContains(response, 'href="?tag=x&amp;page=2"')
+
 
 class YatubePagesTests(TestCase):
     @classmethod
@@ -332,6 +357,8 @@ class CashingIndexTest(TestCase):
         )
 
     def setUp(self):
+        # Откат транзакции теста не сдвигает версии лент в кеше
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -341,17 +368,231 @@ class CashingIndexTest(TestCase):
         response = self.authorized_client.get(
             reverse('posts:main')
         ).content
-        self.post_cache.delete()
-        response_cache = self.authorized_client.get(
-            reverse('posts:main')
-        ).content
+        # Из кеша: только сессия и пользователь, без запроса за постами
+        with self.assertNumQueries(2):
+            response_cache = self.authorized_client.get(
+                reverse('posts:main')
+            ).content
         self.assertEqual(response, response_cache)
 
         cache.clear()
         response_clear = self.authorized_client.get(
             reverse('posts:main')
+        ).content
+        self.assertEqual(response, response_clear)
+
+    def test_cache_key_ignores_unknown_params(self):
+        """Посторонние параметры запроса не заводят новых записей кеша"""
+        keys = {
+            self.authorized_client.get(
+                reverse('posts:main') + query
+            ).context['feed_cache_key']
+            for query in ('', '?utm=1', '?utm=2&x=y')
+        }
+        self.assertEqual(len(keys), 1)
+
+    def test_index_cache_invalidated_by_writes(self):
+        """Удаление поста сразу сбрасывает закешированную ленту"""
+        response = self.authorized_client.get(
+            reverse('posts:main')
+        ).content
+        self.post_cache.delete()
+        response_fresh = self.authorized_client.get(
+            reverse('posts:main')
+        ).content
+        self.assertNotEqual(response, response_fresh)
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Проверка кеша страниц для анонимов"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='SomeUser')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
         )
-        self.assertNotEqual(response, response_clear)
+        cls.other = Post.objects.create(author=cls.user, text='Другой пост')
+
+    def setUp(self):
+        cache.clear()
+        self.detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.other_detail = reverse(
+            'posts:post_detail', kwargs={'post_id': self.other.pk}
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторная страница для анонима отдаётся без запросов к базе"""
+        response = self.client.get(self.detail)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertIn(f'post:{self.post.pk}', response['Surrogate-Key'])
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.detail)
+        self.assertEqual(cached['X-Page-Cache'], 'hit')
+        self.assertEqual(cached.content, response.content)
+
+    def test_comment_purges_only_its_post(self):
+        """Комментарий сбрасывает страницу своего поста, но не чужого"""
+        self.client.get(self.detail)
+        self.client.get(self.other_detail)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        self.assertEqual(self.client.get(self.detail)['X-Page-Cache'], 'miss')
+        self.assertEqual(
+            self.client.get(self.other_detail)['X-Page-Cache'], 'hit'
+        )
+
+    def test_group_rename_purges_pages_with_group(self):
+        """Переименование группы сбрасывает страницы, где она видна"""
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.client.get(group_url)
+        self.client.get(self.detail)
+        self.group.title = 'Новое имя'
+        self.group.save()
+        response = self.client.get(group_url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Новое имя')
+        self.assertEqual(self.client.get(self.detail)['X-Page-Cache'], 'miss')
+
+    def test_unknown_params_bypass_cache(self):
+        """Посторонние параметры не заводят новых записей, а порядок
+        известных не важен"""
+        url = reverse('posts:main')
+        self.client.get(url, {'page': 1, 'order': 'newest'})
+        response = self.client.get(url + '?order=newest&page=1')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        for number in range(3):
+            response = self.client.get(url, {'x': number})
+            self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_authorized_user_bypasses_cache(self):
+        """Страницы авторизованных пользователей не кешируются"""
+        self.client.force_login(self.user)
+        self.client.get(self.detail)
+        response = self.client.get(self.detail)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+
+class SyndicationFeedTest(TestCase):
+    """Проверка лент RSS, Atom и JSON Feed"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='SomeUser')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост в группе', group=cls.group
+        )
+        Post.objects.create(author=cls.user, text='Пост без группы')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_formats(self):
+        """Ленты отдаются во всех форматах, неизвестный формат — 404"""
+        content_types = {
+            'rss': 'application/rss+xml; charset=utf-8',
+            'atom': 'application/atom+xml; charset=utf-8',
+            'json': 'application/feed+json; charset=utf-8',
+        }
+        for feed_format, content_type in content_types.items():
+            with self.subTest(feed_format=feed_format):
+                response = self.client.get(
+                    reverse('posts:index_feed', args=[feed_format])
+                )
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertContains(response, 'Пост без группы')
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(reverse('posts:index_feed', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_group_and_profile_feeds(self):
+        """Лента группы содержит только её посты, профиля — автора"""
+        response = self.client.get(
+            reverse('posts:group_feed', args=['group', 'json'])
+        )
+        items = response.json()['items']
+        self.assertEqual([item['content_text'] for item in items],
+                         ['Пост в группе'])
+        self.assertEqual(items[0]['tags'], ['Группа'])
+        response = self.client.get(
+            reverse('posts:profile_feed', args=['SomeUser', 'json'])
+        )
+        self.assertEqual(len(response.json()['items']), 2)
+
+    def test_conditional_get(self):
+        """Неизменившаяся лента отвечает 304 без запросов к базе"""
+        url = reverse('posts:index_feed', args=['rss'])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified_is_feed_version(self):
+        """Last-Modified ленты — время её версии, а не дата поста"""
+        Post.objects.update(pub_date=datetime(2000, 1, 1, tzinfo=utc))
+        response = self.client.get(reverse('posts:index_feed', args=['rss']))
+        modified = versions_modified(feed_versions(MAIN_FEED))
+        self.assertEqual(
+            response['Last-Modified'], http_date(modified.timestamp())
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """Проверка ответов 304 на страницах чтения"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='SomeUser')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:main'),
+            'group': reverse('posts:group_list', args=['group']),
+            'profile': reverse('posts:profile', args=['SomeUser']),
+            'post_detail': reverse(
+                'posts:post_detail', args=[self.post.pk]
+            ),
+        }
+
+    def test_not_modified_before_render(self):
+        """Совпавший ETag даёт 304 без отрисовки шаблона"""
+        for name, url in self.urls.items():
+            with self.subTest(view=name):
+                etag = self.client.get(url)['ETag']
+                with self.assertTemplateNotUsed('base.html'):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        """Last-Modified принимается в If-Modified-Since"""
+        response = self.client.get(self.urls['index'])
+        response = self.client.get(
+            self.urls['index'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Новый комментарий меняет ETag поста, вход — ETag страницы"""
+        url = self.urls['post_detail']
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
 
 
 class SubscribeTests(TestCase):
@@ -415,6 +656,169 @@ class SubscribeTests(TestCase):
         self.assertEqual(post_text, 'Тестовый текст')
 
 
+class PostCardCacheTest(TestCase):
+    """Проверка кеша отрисованных карточек постов"""
+    CARD = 'posts/includes/post_card.html'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='SomeUser')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост в группе', group=cls.group
+        )
+        Post.objects.create(author=cls.user, text='Пост без группы')
+
+    def setUp(self):
+        cache.clear()
+
+    def rendered_cards(self, url=None):
+        response = self.client.get(url or reverse('posts:main'))
+        return [t.name for t in response.templates].count(self.CARD)
+
+    def test_cards_shared_between_feeds(self):
+        """Карточка, отрисованная для одной ленты, берётся из кеша
+        в других"""
+        self.assertEqual(self.rendered_cards(), 2)
+        self.assertEqual(
+            self.rendered_cards(reverse('posts:profile', args=['SomeUser'])),
+            0
+        )
+
+    def test_only_changed_cards_rendered(self):
+        """После нового поста, правки и переименования группы
+        отрисовываются только изменившиеся карточки"""
+        self.rendered_cards()
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(self.rendered_cards(), 1)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(self.rendered_cards(), 1)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.client.get(reverse('posts:main'))
+        self.assertContains(response, 'Новое название')
+        self.assertEqual(
+            [t.name for t in response.templates].count(self.CARD), 1
+        )
+
+
+class FollowGraphTest(TestCase):
+    """Проверка кеша подписок"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        Post.objects.create(author=cls.author, text='Пост автора')
+        Post.objects.create(author=cls.other, text='Пост другого')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def test_follow_state_without_follow_table(self):
+        """Состояние подписки в профиле берётся из кеша и сбрасывается
+        при подписке и отписке"""
+        url = reverse('posts:profile', args=['author'])
+        self.assertFalse(self.client.get(url).context['following'])
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        self.assertTrue(self.client.get(url).context['following'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertFalse(any(
+            Follow._meta.db_table in query['sql']
+            for query in queries.captured_queries
+        ))
+        self.client.get(reverse('posts:profile_unfollow', args=['author']))
+        self.assertFalse(self.client.get(url).context['following'])
+
+    def test_follow_ignores_stale_cache(self):
+        """Подписка и отписка пишут в базу, даже если кеш подписок
+        устарел"""
+        key = following_key(self.follower.pk)
+        cache.set(key, array('q', [self.author.pk]), None)
+        self.client.get(reverse('posts:profile_follow', args=['author']))
+        self.assertTrue(Follow.objects.filter(user=self.follower).exists())
+        cache.set(key, array('q'), None)
+        self.client.get(reverse('posts:profile_unfollow', args=['author']))
+        self.assertFalse(Follow.objects.filter(user=self.follower).exists())
+        self.assertFalse(is_following(self.follower.pk, self.author.pk))
+
+    def test_new_follow_drops_cached_graph(self):
+        """Подписка, созданная в обход представлений, сбрасывает кеш"""
+        self.assertFalse(is_following(self.follower.pk, self.author.pk))
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertTrue(is_following(self.follower.pk, self.author.pk))
+        self.assertFalse(is_following(self.follower.pk, self.other.pk))
+
+
+class TimelineTests(TestCase):
+    """Проверка материализованной ленты подписок"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        """Подписка добавляет старые посты, новые раскладываются сразу"""
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username}
+        ))
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            list(Timeline.objects.filter(
+                user=self.follower
+            ).values_list('post_id', flat=True)),
+            [new_post.pk, self.old_post.pk]
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post]
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        self.assertFalse(
+            Timeline.objects.filter(user=self.follower).exists()
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_follow_feed_cache_tracks_author_posts(self):
+        """Пост автора сбрасывает ленту подписчика без записи в его ключ"""
+        cache.clear()
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.follower_client.get(reverse('posts:follow_index'))
+        follower_key = VERSION_KEY.format(follow_feed(self.follower.pk))
+        version = cache.get(follower_key)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(cache.get(follower_key), version)
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, new_post.text)
+        new_post.text = 'Исправленный пост'
+        new_post.save()
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Исправленный пост')
+
+
 class CommentTest(TestCase):
     """Проверка комментариев"""
     @classmethod
@@ -444,3 +848,54 @@ class CommentTest(TestCase):
             author=self.commentator,
             text='Тестовый комментарий'
         ).exists)
+
+
+class CommentPaginationTest(TestCase):
+    """Проверка постраничной подгрузки комментариев"""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='postmaker')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+        cls.comments = list(cls.post.comments.order_by('created', 'pk'))
+
+    def test_first_page_and_fragment(self):
+        """Пост отдаёт первую страницу, фрагмент — продолжение"""
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        ))
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:20])
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments_list.html')
+        next_page = response.context['comments']
+        self.assertEqual(list(next_page), self.comments[20:])
+        self.assertFalse(next_page.has_next())
+
+    def test_not_loaded_when_hidden(self):
+        """Кому комментарии не показываются, тот не платит за их запрос"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ))
+        self.assertFalse(any(
+            Comment._meta.db_table in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_newest_first(self):
+        """?order=newest листает комментарии от новых к старым"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'order': 'newest'}
+        )
+        self.assertEqual(
+            list(response.context['comments']), self.comments[::-1][:20]
+        )
@@ -0,0 +1,36 @@
+import logging
+
+from sorl.thumbnail import get_thumbnail
+
+from core.background import BackgroundPool
+from .images import variants
+
+logger = logging.getLogger(__name__)
+
+# У каждого потока пула своё соединение для хранилища ключей sorl
+_pool = BackgroundPool('THUMBNAIL_WORKERS', 'thumbnails')
+
+
+def generate_thumbnails(name):
+    """Создаёт все варианты картинки из хранилища (`images.variants`).
+
+    Возвращает число готовых миниатюр; битая картинка пишется в лог
+    и не мешает остальным.
+    """
+    done = 0
+    for _, _, geometry, options in variants():
+        try:
+            get_thumbnail(name, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+        else:
+            done += 1
+    return done
+
+
+def schedule_thumbnails(name):
+    """Ставит генерацию миниатюр картинки в фоновый пул.
+
+    При `THUMBNAIL_WORKERS = 0` миниатюры создаются сразу.
+    """
+    return _pool.submit(generate_thumbnails, name)
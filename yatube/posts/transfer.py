@@ -0,0 +1,207 @@
+"""Потоковые выгрузка и загрузка контента в формате NDJSON.
+
+Каждая строка — объект одной модели в духе `dumpdata`:
+
+    {"model": "posts.post", "pk": 1, "fields": {"text": "...", ...}}
+
+Внешние ключи хранятся как id (`author_id`), пользователи не
+выгружаются: на принимающей стороне они должны уже существовать с теми
+же id. Память не растёт с числом строк: выгрузка читает базу
+итератором, загрузка копит не больше одной пачки объектов.
+"""
+import datetime
+import json
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.sql import InsertQuery
+
+from core.page_cache import purge_surrogate_keys
+from .cache import (ALL_FEEDS, MAIN_PAGE, POST_CARDS, author_key, bump_feeds,
+                    group_key, post_key)
+from .follow_graph import forget_following
+from .models import Comment, Follow, Group, Post, Timeline, User, UserStats
+from .stats import rebuild_user_stats
+
+# Порядок важен: при загрузке связанные объекты идут раньше ссылающихся
+MODELS = (Group, Post, Comment, Follow)
+BATCH_SIZE = 1000
+
+# Суррогатные ключи страниц, на которых виден загруженный объект
+PAGE_KEYS = {
+    Group: lambda group: [group_key(group.pk)],
+    Post: lambda post: [
+        post_key(post.pk),
+        author_key(post.author_id),
+        *([group_key(post.group_id)] if post.group_id else []),
+    ],
+    Comment: lambda comment: [post_key(comment.post_id)],
+    Follow: lambda follow: [author_key(follow.author_id)],
+}
+
+
+class Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder обрезает время до миллисекунд, а ключ курсора
+    # ленты — (pub_date, id): храним дату с точностью базы
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _attnames(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+
+
+def insert_rows(model, objs, ignore_conflicts=False):
+    """Вставляет объекты как есть, как `loaddata`: без `pre_save` полей.
+
+    Поэтому `auto_now_add` не подменяет даты из выгрузки, а сами поля
+    модели не меняются и соседние потоки этого не видят. Возвращает
+    число вставленных строк: при `ignore_conflicts` конфликтующие
+    строки пропускаются базой и не считаются.
+    """
+    fields = model._meta.concrete_fields
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            query = InsertQuery(model, ignore_conflicts=ignore_conflicts)
+            query.insert_values(
+                fields, objs[start:start + batch_size], raw=True
+            )
+            compiler = query.get_compiler(connection=connection)
+            for sql, params in compiler.as_sql():
+                cursor.execute(sql, params)
+                inserted += cursor.rowcount
+    return inserted
+
+
+def export_content(stream, models=MODELS, batch_size=BATCH_SIZE,
+                   progress=None):
+    """Пишет объекты `models` в `stream` по строке на объект.
+
+    `progress(label, count)` вызывается после каждой пачки и в конце
+    модели. Возвращает словарь с числом строк по моделям.
+    """
+    totals = {}
+    for model in models:
+        label = _label(model)
+        fields = _attnames(model)
+        rows = model._default_manager.order_by('pk').values_list(
+            'pk', *fields
+        ).iterator(chunk_size=batch_size)
+        count = 0
+        for pk, *values in rows:
+            record = {
+                'model': label, 'pk': pk, 'fields': dict(zip(fields, values))
+            }
+            stream.write(json.dumps(
+                record,
+                cls=Encoder,
+                ensure_ascii=False
+            ))
+            stream.write('\n')
+            count += 1
+            if progress and count % batch_size == 0:
+                progress(label, count)
+        if progress:
+            progress(label, count)
+        totals[label] = count
+    return totals
+
+
+class Importer:
+    """Загружает строки NDJSON пачками многострочных INSERT.
+
+    Сигналы при этом не срабатывают, поэтому после загрузки
+    `finish()` пересчитывает счётчики, ленты подписок и сбрасывает кеши.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, ignore_conflicts=False,
+                 progress=None):
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.progress = progress or (lambda label, count: None)
+        self.models = {_label(model): model for model in MODELS}
+        self.totals = dict.fromkeys(self.models, 0)
+        self.model = None
+        self.pending = []
+
+    def load(self, stream):
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                model = self.models[record['model']]
+                obj = model(pk=record['pk'], **record['fields'])
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f'Строка {number}: {error!r}') from error
+            if model is not self.model or len(self.pending) >= self.batch_size:
+                self.flush()
+                self.model = model
+            self.pending.append(obj)
+        self.flush()
+        self.finish()
+        return self.totals
+
+    def flush(self):
+        if not self.pending:
+            return
+        label = _label(self.model)
+        with transaction.atomic():
+            inserted = insert_rows(
+                self.model, self.pending, self.ignore_conflicts
+            )
+        purge_surrogate_keys(*{
+            key for obj in self.pending for key in PAGE_KEYS[self.model](obj)
+        })
+        if self.model is Follow:
+            forget_following(*{obj.user_id for obj in self.pending})
+        self.totals[label] += inserted
+        self.progress(label, self.totals[label])
+        self.pending = []
+
+    def finish(self):
+        loaded = [
+            self.models[label] for label, count in self.totals.items() if count
+        ]
+        if not loaded:
+            return
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), loaded):
+                cursor.execute(sql)
+        if Post in loaded or Follow in loaded:
+            fill_timelines()
+        with transaction.atomic():
+            rebuild_user_stats(User, UserStats, Post, Comment, Follow)
+        bump_feeds(ALL_FEEDS)
+        purge_surrogate_keys(MAIN_PAGE, POST_CARDS)
+
+
+def fill_timelines():
+    """Достраивает ленты подписок одним INSERT ... SELECT на стороне базы.
+
+    Уже существующие записи пропускаются по уникальному ограничению.
+    """
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    suffix = connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    timeline = Timeline._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {timeline} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'INNER JOIN {Post._meta.db_table} post '
+            f'ON post.author_id = follow.author_id {suffix}'
+        )
@@ -1,72 +1,218 @@
+from operator import attrgetter
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render, get_object_or_404
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 # from django.views.decorators.cache import cache_page
+from core.db_routing import note_write
+from core.http import not_modified, set_validators, version_validators
+from core.page_cache import add_surrogate_keys
+from .cache import (MAIN_FEED, MAIN_PAGE, POST_CARDS, author_key,
+                    feed_cache_key, feed_count_key, feed_versions,
+                    follow_feed, follow_feed_versions, group_feed,
+                    group_key, post_key, profile_feed)
+from .follow_graph import following_ids, forget_following, is_following
 from .forms import PostForm, CommentForm
-from .models import Follow, Post, Group, User
+from .models import Follow, Post, Group, Timeline, User, UserStats
+from .paginator import (POSTS_PER_PAGE, CappedCountPaginator, paginate,
+                        paginate_comments)
+from .search import search_posts
+from .syndication import GENERATORS, feed_data, feed_etag, render_feed
+
+
+def feed_context(request, feed, queryset, versions=None, **kwargs):
+    """Страница ленты и ключ её кеша в шаблоне.
+
+    Страница ленивая: если отрисованная лента есть в кеше, запрос
+    к базе за постами не выполняется вовсе.
+    """
+    return {
+        'page_obj': SimpleLazyObject(
+            lambda: paginate(
+                request, queryset, count_key=feed_count_key(feed), **kwargs
+            )
+        ),
+        'feed_cache_key': feed_cache_key(request, feed, versions),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
 
 
 # @cache_page(20)
 def index(request):
     """Главная страница"""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {
-        'page_obj': page_obj,
-    }
-    return render(request, 'posts/index.html', context)
+    validators = version_validators(request, {
+        **add_surrogate_keys(request, MAIN_PAGE, POST_CARDS),
+        **feed_versions(MAIN_FEED),
+    }, 'index')
+    response = not_modified(request, *validators)
+    if response is not None:
+        return response
+    post_list = Post.objects.select_related('author', 'group')
+    context = feed_context(request, MAIN_FEED, post_list)
+    response = render(request, 'posts/index.html', context)
+    return set_validators(response, *validators)
 
 
 def group_posts(request, slug):
     """Страница со списком групп"""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    validators = version_validators(request, {
+        **add_surrogate_keys(request, group_key(group.pk)),
+        **feed_versions(group_feed(group.pk)),
+    }, 'group')
+    response = not_modified(request, *validators)
+    if response is not None:
+        return response
+    posts = group.posts.select_related('author', 'group')
     context = {
         'group': group,
-        'page_obj': page_obj,
+        **feed_context(request, group_feed(group.pk), posts),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    return set_validators(response, *validators)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_number = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author).exists()
-    else:
-        following = False
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    validators = version_validators(request, {
+        **add_surrogate_keys(request, author_key(author.pk), POST_CARDS),
+        **feed_versions(profile_feed(author.pk)),
+    }, 'profile')
+    response = not_modified(request, *validators)
+    if response is not None:
+        return response
+    post_list = author.posts.select_related('author', 'group')
+    posts_number = UserStats.for_user(author).posts_count
+    following = request.user.is_authenticated and is_following(
+        request.user.pk, author.pk
+    )
     context = {
         'author': author,
         'post_list': post_list,
         'posts_number': posts_number,
-        'page_obj': page_obj,
-        'following': following
+        'following': following,
+        **feed_context(request, profile_feed(author.pk), post_list),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return set_validators(response, *validators)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    author_posts = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    validators = version_validators(request, add_surrogate_keys(
+        request,
+        post_key(post.pk),
+        author_key(post.author_id),
+        *([group_key(post.group_id)] if post.group_id else [])
+    ), 'post_detail')
+    response = not_modified(request, *validators)
+    if response is not None:
+        return response
+    author_posts = UserStats.for_user(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all
+    # Комментарии выводятся не всем: запрос — только если шаблон до них
+    # дойдёт
+    comments = SimpleLazyObject(lambda: paginate_comments(request, post))
     context = {
         'post': post,
         'author_posts': author_posts,
         'form': form,
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    response = render(request, 'posts/post_detail.html', context)
+    return set_validators(response, *validators)
+
+
+def post_comments(request, post_id):
+    """Фрагмент со следующей страницей комментариев для подгрузки."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    add_surrogate_keys(request, post_key(post.pk))
+    context = {
+        'post': post,
+        'comments': paginate_comments(request, post),
+    }
+    return render(request, 'posts/includes/comments_list.html', context)
+
+
+def search(request):
+    """Поиск по тексту постов, самые релевантные первыми."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        posts = search_posts(query).select_related('author', 'group')
+        paginator = CappedCountPaginator(posts, POSTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def syndication(request, feed, queryset, feed_format, title, link):
+    """Лента в формате RSS, Atom или JSON Feed с условным GET."""
+    if feed_format not in GENERATORS:
+        raise Http404
+    data = feed_data(feed, queryset)
+    etag = feed_etag(data, feed_format, title)
+    response = not_modified(request, etag, data['last_modified'])
+    if response is not None:
+        return response
+    body, content_type = render_feed(
+        data,
+        feed_format,
+        title=title,
+        link=request.build_absolute_uri(link),
+        feed_url=request.build_absolute_uri(),
+        description=title,
+        item_link=lambda pk: request.build_absolute_uri(
+            reverse('posts:post_detail', args=[pk])
+        ),
+    )
+    response = HttpResponse(body, content_type=content_type)
+    return set_validators(response, etag, data['last_modified'])
+
+
+def index_feed(request, feed_format):
+    return syndication(
+        request,
+        MAIN_FEED,
+        Post.objects.select_related('author', 'group'),
+        feed_format,
+        title='Последние обновления на сайте',
+        link=reverse('posts:main'),
+    )
+
+
+def group_posts_feed(request, slug, feed_format):
+    group = get_object_or_404(Group, slug=slug)
+    return syndication(
+        request,
+        group_feed(group.pk),
+        group.posts.select_related('author', 'group'),
+        feed_format,
+        title=f'Записи группы {group.title}',
+        link=reverse('posts:group_list', args=[slug]),
+    )
+
+
+def profile_posts_feed(request, username, feed_format):
+    author = get_object_or_404(User, username=username)
+    return syndication(
+        request,
+        profile_feed(author.pk),
+        author.posts.select_related('author', 'group'),
+        feed_format,
+        title=f'Записи пользователя {author.get_full_name() or username}',
+        link=reverse('posts:profile', args=[username]),
+    )
 
 
 @login_required
@@ -123,27 +269,41 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {
-        'page_obj': page_obj,
-    }
+    author_ids = following_ids(request.user.pk)
+    if author_ids:
+        entries = request.user.timeline.select_related(
+            'post__author', 'post__group'
+        )
+    else:
+        # Без подписок лента пуста, в базу за ней не ходим
+        entries = Timeline.objects.none()
+    context = feed_context(
+        request,
+        follow_feed(request.user.pk),
+        entries,
+        versions=follow_feed_versions(request.user.pk, author_ids),
+        keys=('pub_date', 'post_id'),
+        item=attrgetter('post')
+    )
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
+    # Запись в базу идёт всегда: устаревший кеш подписок не должен
+    # решать, нужна ли она
     if request.user != author:
         Follow.objects.get_or_create(user=request.user, author=author)
+        forget_following(request.user.pk)
+        note_write()
     return redirect('posts:profile', author)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.filter(user=request.user, author=author).delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
+    forget_following(request.user.pk)
+    note_write()
     return redirect('posts:profile', author)
@@ -55,13 +55,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики маршрутов (core.metrics); первой, чтобы охватить остальные
+    'core.metrics.MetricsMiddleware',
+    # Замер SQL, шаблонов и кеша
+    'core.timing.RequestTimingMiddleware',
+    # Журнал медленных SQL-запросов (core.slow_queries)
+    'core.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Отвечает 304 и на страницы из кеша для анонимов
+    'django.middleware.http.ConditionalGetMiddleware',
+    # Выбирает базу для чтения: реплику или основную
+    'core.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.page_cache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -101,6 +112,53 @@ DATABASES = {
     }
 }
 
+# Прагмы SQLite для каждого нового соединения (core.sqlite)
+SQLITE_PRAGMAS = {}
+# Прагмы рабочего профиля
+SQLITE_PRODUCTION_PRAGMAS = {
+    # Читатели не ждут писателя, писатель — читателей
+    'journal_mode': 'WAL',
+    # Ждать блокировку до 5 с вместо ошибки «database is locked»
+    'busy_timeout': 5000,
+    # В режиме WAL база не портится при сбое, fsync — на контрольной точке
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер кеша страниц в КиБ
+    'cache_size': -64 * 1024,
+}
+# Рабочий профиль: WAL и прагмы, транзакции BEGIN IMMEDIATE и постоянные
+# соединения вместо нового на каждый запрос
+if os.environ.get('YATUBE_DB_PROFILE') == 'production':
+    DATABASES['default'].update(ENGINE='core.sqlite', CONN_MAX_AGE=600)
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+
+# Реплики только для чтения (core.db_routing): пути к копиям базы через
+# запятую в YATUBE_DB_REPLICAS. Локально копии обновляет команда
+# sync_replicas; в тестах реплики совпадают с основной базой.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')),
+    start=1
+):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db_routing.ReplicaRouter']
+
+# Представления, которые читают с реплик
+REPLICA_VIEWS = (
+    'posts:main',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+# Отставание реплик, секунд: столько после записи клиент и после
+# изменения данных все запросы читают с основной базы
+REPLICA_LAG = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -153,8 +211,90 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Картинки постов: пределы загрузки; оригинал шире POST_IMAGE_MAX_WIDTH,
+# тяжелее POST_IMAGE_REENCODE_BYTES или с метаданными пересохраняется
+# в первый поддержанный Pillow формат из POST_IMAGE_FORMATS
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_WIDTH = 2560
+POST_IMAGE_REENCODE_BYTES = 1024 * 1024
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+POST_IMAGE_QUALITY = 82
+# Ширины вариантов для srcset и пропорции обложки в ленте; варианты
+# создаются в фоне сразу после загрузки картинки
+POST_IMAGE_WIDTHS = (480, 960, 1920)
+POST_IMAGE_RATIO = (960, 339)
+# Размер пула фоновой генерации миниатюр; 0 — создавать сразу
+THUMBNAIL_WORKERS = 2
+
+# Кеш, общий для всех процессов сервера (core.sqlite.cache). Ленты и
+# страницы хранятся в нём часами и сбрасываются сдвигом версий, поэтому
+# кеш в памяти процесса не годится: правку, принятую одним процессом,
+# остальные не увидели бы до истечения срока. Файл задаётся
+# YATUBE_CACHE_FILE.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_FILE', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
+
+# Доля запросов, для которых замеряется время SQL, шаблонов и кеша
+# (заголовок Server-Timing для сотрудников, core.timing); 0 — middleware
+# отключена
+REQUEST_TIMING_SAMPLE_RATE = 0.0
+# Писать замеры строкой JSON в лог core.timing
+REQUEST_TIMING_LOG = False
+
+# Файл SQLite, где процессы сервера копят метрики маршрутов
+# (core.metrics, /metrics/); без него метрики отключены
+METRICS_FILE = os.environ.get('YATUBE_METRICS_FILE')
+# Как часто процесс сбрасывает свои счётчики в файл, с
+METRICS_FLUSH_INTERVAL = 5
+# Границы корзин гистограммы времени ответа, с
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Токен сборщика метрик: /metrics/ отдаётся с заголовком
+# «Authorization: Bearer <токен>» и сотрудникам
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN')
+
+# Порог медленного SQL-запроса, с: такие запросы с планом пишутся в
+# таблицу SlowQuery (core.slow_queries, видна в админке); None — не писать
+SLOW_QUERY_THRESHOLD = None
+if os.environ.get('YATUBE_SLOW_QUERY_MS'):
+    SLOW_QUERY_THRESHOLD = int(os.environ['YATUBE_SLOW_QUERY_MS']) / 1000
+# Доля медленных запросов, которые записываются
+SLOW_QUERY_SAMPLE_RATE = 1.0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Отрисованные страницы лент; ключ меняется с версией ленты, а срок лишь
+# ограничивает память под старые версии
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Отрисованные карточки постов (posts.cards); ключ меняется с правкой
+# поста, а срок лишь ограничивает память под старые версии
+POST_CARD_TIMEOUT = 24 * 60 * 60
+
+# Страницы для анонимов сбрасываются по суррогатным ключам; срок жизни
+# лишь ограничивает память под редко открываемые страницы.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 60
+# Параметры запроса, которые читают представления; страницы с другими
+# параметрами не кешируются (core.page_cache)
+ANONYMOUS_PAGE_CACHE_PARAMS = ('page', 'after', 'before', 'order', 'q')
+
+# Число постов в лентах для номерной пагинации пересчитывается в фоне,
+# если подсчёт старше стольких секунд; 0 потоков — пересчёт сразу
+FEED_COUNT_TTL = 60
+FEED_COUNT_WORKERS = 1